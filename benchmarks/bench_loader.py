@@ -0,0 +1,238 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#
+# This file is part of the dodoo-loader (R) project.
+# Copyright (c) 2018 XOE Corp. SAS
+# Authors: David Arnold, et al.
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library; if not, see <http://www.gnu.org/licenses/>.
+#
+
+""" Benchmarks the loader pipeline stages on synthetic datasets.
+
+Data is loaded into the given database and rolled back afterwards.
+Results are written as json, so they can be compared across versions. """
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import tempfile
+from builtins import open
+
+import click
+import dodoo
+import pandas as pd
+from dodoo import odoo
+from future import standard_library
+
+from dodoo_loader import cli
+
+standard_library.install_aliases()
+
+
+DATASETS = ["partner", "state", "hierarchy", "xlsx"]
+COUNTRIES = ["base.us", "base.fr", "base.be", "base.de", "base.es"]
+# Metrics stages, as reported by the benchmark
+STAGES = {"load": "odoo_load"}
+
+
+def _partners(rows, prefix="bench_partner"):
+    return pd.DataFrame(
+        {
+            "id": ["__import__.{}_{}".format(prefix, i) for i in range(rows)],
+            "name": ["Partner {}".format(i) for i in range(rows)],
+            "street": ["{} Bench Street".format(i) for i in range(rows)],
+            "city": ["Bench City {}".format(i % 100) for i in range(rows)],
+            "zip": ["{:05d}".format(i % 100000) for i in range(rows)],
+            "country_id/id": [COUNTRIES[i % len(COUNTRIES)] for i in range(rows)],
+            "email": ["partner{}@bench.example.com".format(i) for i in range(rows)],
+        },
+        columns=["id", "name", "street", "city", "zip", "country_id/id", "email"],
+    )
+
+
+def _states(rows, prefix="bench_state"):
+    return pd.DataFrame(
+        {
+            "id": ["__import__.{}_{}".format(prefix, i) for i in range(rows)],
+            "name": ["State {}".format(i) for i in range(rows)],
+            "code": ["B{:06d}".format(i) for i in range(rows)],
+            "country_id/id": [COUNTRIES[i % len(COUNTRIES)] for i in range(rows)],
+        },
+        columns=["id", "name", "code", "country_id/id"],
+    )
+
+
+def _hierarchy(rows, fanout=5, prefix="bench_tree"):
+    """ A partner tree, shuffled, so that it needs reordering """
+    ids = ["__import__.{}_{}".format(prefix, i) for i in range(rows)]
+    df = pd.DataFrame(
+        {
+            "id": ids,
+            "name": ["Tree Partner {}".format(i) for i in range(rows)],
+            "is_company": ["yes" if i < rows // fanout else "no" for i in range(rows)],
+            "parent_id/id": [ids[(i - 1) // fanout] if i else "" for i in range(rows)],
+        },
+        columns=["id", "name", "is_company", "parent_id/id"],
+    )
+    order = list(range(rows))
+    random.Random(rows).shuffle(order)
+    return df.iloc[order]
+
+
+def _write(dataset, rows, tmpdir):
+    """ Writes a synthetic dataset. Returns its paths. """
+    if dataset == "partner":
+        path = os.path.join(tmpdir, "res.partner.csv")
+        _partners(rows).to_csv(path, index=False)
+        return [path]
+    if dataset == "state":
+        path = os.path.join(tmpdir, "res.country.state.json")
+        _states(rows).to_json(path, orient="records")
+        return [path]
+    if dataset == "hierarchy":
+        path = os.path.join(tmpdir, "res.partner.csv")
+        _hierarchy(rows).to_csv(path, index=False)
+        return [path]
+    if dataset == "xlsx":
+        path = os.path.join(tmpdir, "bench.xlsx")
+        with pd.ExcelWriter(path) as writer:
+            _states(rows, "bench_xlsx_state").to_excel(
+                writer, sheet_name="res.country.state", index=False
+            )
+            _partners(rows, "bench_xlsx_partner").to_excel(
+                writer, sheet_name="res.partner", index=False
+            )
+        return [path]
+    raise click.BadParameter("Unknown dataset {}".format(dataset))
+
+
+def bench_dataset(env, paths, batch, onchange):
+    """ Runs the loader pipeline on paths and sums up the seconds of its
+    --metrics records by stage. Returns {stage: seconds}. """
+    metrics = io.BytesIO()
+    files = [open(path, "rb") for path in paths]
+    try:
+        cli.load_pipeline(
+            env,
+            file=files,
+            stream=(),
+            manifest=None,
+            chatter=False,
+            onchange=onchange,
+            resolve_ids=False,
+            raw=False,
+            typed=False,
+            batch=batch,
+            batch_target=0,
+            lazy=False,
+            workers=1,
+            processes=False,
+            read_workers=1,
+            bisect=False,
+            reject=None,
+            commit_every=0,
+            metadata_cache=None,
+            cache_dir=None,
+            cache_size=0,
+            metrics=metrics,
+            incremental=False,
+            out=None,
+        )
+    finally:
+        for f in files:
+            f.close()
+        env.cr.rollback()
+    stages = {}
+    for line in metrics.getvalue().decode("utf-8").splitlines():
+        record = json.loads(line)
+        # Batches and nodes sum up their onchange and load stages
+        if record["stage"] in ("batch", "node"):
+            continue
+        stage = STAGES.get(record["stage"], record["stage"])
+        stages[stage] = stages.get(stage, 0.0) + record["seconds"]
+    return stages
+
+
+@click.command(cls=dodoo.CommandWithOdooEnv)
+@dodoo.options.addons_path_opt(True)
+@dodoo.options.db_opt(True)
+@click.option(
+    "--dataset",
+    type=click.Choice(DATASETS),
+    multiple=True,
+    help="Dataset to benchmark. Can be repeated. Defaults to all datasets.",
+)
+@click.option(
+    "--rows",
+    default=1000,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help="Number of rows per generated table.",
+)
+@click.option("--batch", default=50, show_default=True, help="The batch size.")
+@click.option(
+    "--onchange/--no-onchange",
+    default=False,
+    show_default=True,
+    help="Trigger onchange methods.",
+)
+@click.option(
+    "--output",
+    type=click.File("w"),
+    default="-",
+    help="Write the results into a json file.  [default: stdout]",
+)
+def benchmark(env, dataset, rows, batch, onchange, output):
+    """ Benchmarks the loader pipeline stages on synthetic datasets.
+
+    Loaded data is rolled back. Results are written as json.
+    """
+    results = {
+        "odoo": odoo.release.version,
+        "pandas": pd.__version__,
+        "python": platform.python_version(),
+        "batch": batch,
+        "onchange": onchange,
+        "datasets": [],
+    }
+    tmpdir = tempfile.mkdtemp(prefix="dodoo-loader-bench-")
+    try:
+        for name in dataset or DATASETS:
+            datadir = os.path.join(tmpdir, name)
+            os.mkdir(datadir)
+            stages = bench_dataset(env, _write(name, rows, datadir), batch, onchange)
+            results["datasets"].append(
+                {
+                    "name": name,
+                    "rows": rows,
+                    "stages": stages,
+                    "rows_per_sec": rows / stages["flush_all"]
+                    if stages["flush_all"]
+                    else None,
+                }
+            )
+    finally:
+        shutil.rmtree(tmpdir)
+    output.write(json.dumps(results, sort_keys=True, indent=4) + "\n")
+
+
+if __name__ == "__main__":  # pragma: no cover
+    benchmark()
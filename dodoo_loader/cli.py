@@ -22,24 +22,53 @@
 
 from __future__ import absolute_import, division, print_function, unicode_literals
 
+import functools
 import gc
+import hashlib
+import io
+import itertools
 import json
 import logging
+import multiprocessing
 import os
+import sys
+import tempfile
+import threading
+import timeit
+import zipfile
 from builtins import bytes, open
 from collections import OrderedDict
+from contextlib import contextmanager
+from multiprocessing.pool import ThreadPool
 
 import click
 import dodoo
 import networkx as nx
 import numpy as np
 import pandas as pd
+import yaml
 from dodoo import odoo
 from future import standard_library
-from future.utils import viewitems
+from future.utils import raise_from, string_types, viewitems
 
 # etc., as needed
 
+try:
+    import resource
+except ImportError:  # Not available on windows
+    resource = None
+
+try:
+    import openpyxl
+except ImportError:  # Streams xlsx sheets, with the xlsx extra
+    openpyxl = None
+
+try:
+    import pyarrow as pa
+    from pyarrow import feather, parquet as pq
+except ImportError:  # Reads columnar formats, with the arrow extra
+    pa = None
+
 
 standard_library.install_aliases()
 
@@ -47,17 +76,149 @@ standard_library.install_aliases()
 _logger = logging.getLogger(__name__)
 
 
-SUPPORTED_FORMATS = ["csv", "json"]
+SUPPORTED_FORMATS_COLUMNAR = ["parquet", "arrow", "feather"]
+SUPPORTED_FORMATS = ["csv", "json", "jsonl"] + SUPPORTED_FORMATS_COLUMNAR
 SUPPORTED_FORMATS_EXCEL = ["xlsx", "xls"]
+SUPPORTED_FORMATS_LAZY = ["csv", "jsonl"] + SUPPORTED_FORMATS_COLUMNAR
+XMLID_CACHE_SIZE = 2 ** 16
+ONCHANGE_FLAGS_CACHE_SIZE = 32  # Sets of columns per model
+ADAPTIVE_BATCH_MAX = 10000
+INPUT_CACHE_FORMAT = 1  # Bump, when parsing or index normalization changes
+DATE_FORMAT = "%Y-%m-%d"
+DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+# Per model options a manifest can set, with their type and minimum
+MANIFEST_OPTIONS = OrderedDict(
+    [
+        ("batch", (int, 1)),
+        ("onchange", (bool, None)),
+        ("chatter", (bool, None)),
+        ("workers", (int, 1)),
+        ("commit_every", (int, 0)),
+    ]
+)
+
+
+class Payload(object):
+    """ A chunk serialized into the fields and data arguments of load().
+    Slicing it shares fields and rows, so a node's DataFrame only needs to
+    be converted once. """
+
+    def __init__(self, fields, rows):
+        self.fields = fields
+        self.rows = rows
+
+    @classmethod
+    def from_frame(cls, df, typed=False):
+        """ Converts df into load() strings, or, if typed, into python values
+        with False for empty cells, as create() takes them """
+        df = _plain(df)
+        if typed:
+            rows = df.astype(object).where(df.notnull(), False).reset_index()
+        else:
+            rows = df.fillna("").astype(str).reset_index()
+        return cls([df.index.name] + df.columns.tolist(), rows.values.tolist())
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, key):
+        return Payload(self.fields, self.rows[key])
+
+    @property
+    def index(self):
+        return [row[0] for row in self.rows]
+
+
+def _plain(df):
+    """ Returns df with its typed columns (categoricals, nullable integers and
+    dates) as object columns of python values and NaN for missing values.
+    Dates are formatted as odoo strings: timezone aware ones (datetime
+    fields, in UTC) and naive ones with a time as datetimes, else as dates. """
+    typed = [
+        col
+        for col, dtype in viewitems(df.dtypes)
+        if pd.api.types.is_extension_array_dtype(dtype)
+        or pd.api.types.is_datetime64_any_dtype(dtype)
+    ]
+    if not typed:
+        return df
+    df = df.copy()
+    for col in typed:
+        column = df[col]
+        if pd.api.types.is_datetime64_any_dtype(column.dtype):
+            dates = (
+                column.dt.tz is None
+                and (column.dt.normalize() == column)[column.notnull()].all()
+            )
+            values = column.dt.strftime(DATE_FORMAT if dates else DATETIME_FORMAT)
+        else:
+            values = column.astype(object)
+        df[col] = values.where(column.notnull(), np.nan)
+    return df
+
+
+class BatchSizer(object):
+    """ Adapts the batch size of a node, so that batches take about target
+    seconds. Starts at a probe size and rescales it by the observed
+    seconds per row, by at most a factor of two per batch. Failed batches
+    halve it, so that failures roll back fewer rows. """
+
+    def __init__(self, size, target, maximum=ADAPTIVE_BATCH_MAX):
+        self.size = size
+        self.target = target
+        self.maximum = maximum
+
+    def observe(self, rows, seconds, failed=False):
+        if failed:
+            self.size = max(1, self.size // 2)
+        elif rows and seconds > 0:
+            ideal = int(rows * self.target / seconds)
+            self.size = max(1, min(ideal, 2 * self.size, self.maximum))
+
+
+def _rechunk(frames, sizer):
+    """ Yields chunks out of an iterable of DataFrames or Payloads, each
+    one as large as the sizer says by the time it gets requested. """
+
+    def cut(frame, start, stop=None):
+        if isinstance(frame, Payload):
+            return frame[start:stop]
+        return frame.iloc[start:stop].copy()
+
+    buf, pos = None, 0
+    for frame in frames:
+        if not len(frame):
+            continue
+        if (
+            isinstance(frame, Payload)
+            and buf is not None
+            and frame.fields != buf.fields
+        ):
+            # Rows only join under the same fields: emit the rest as it is
+            if len(buf) > pos:
+                yield cut(buf, pos)
+            buf = None
+        if buf is None:
+            buf = frame
+        elif isinstance(frame, Payload):
+            buf = Payload(frame.fields, buf.rows[pos:] + frame.rows)
+        else:
+            buf = pd.concat([buf.iloc[pos:], frame])
+        pos = 0
+        while len(buf) - pos >= sizer.size:
+            size = sizer.size
+            yield cut(buf, pos, pos + size)
+            pos += size
+    if buf is not None and len(buf) > pos:
+        yield cut(buf, pos)
 
 
 def odoo_load(env, model, chunk):
-    """ Loads a chunk into model.
+    """ Loads a chunk (DataFrame or Payload) into model.
     Public method. Can be scheduled into threads. Interface method. """
-    res = env[model].load(
-        [chunk.index.name] + chunk.columns.tolist(),  # fields
-        chunk.fillna("").astype(str).reset_index().values.tolist(),  # data
-    )
+    if not isinstance(chunk, Payload):
+        chunk = Payload.from_frame(chunk)
+    res = env[model].load(chunk.fields, chunk.rows)
 
     # Make current return API more explicit
     if not res["ids"]:
@@ -65,66 +226,652 @@ def odoo_load(env, model, chunk):
     return "success", res["ids"], res["messages"]
 
 
-def _onchange(env, model, chunk, field_onchange, is_external_id):
-    model = env[model]
+def odoo_load_bisect(env, model, chunk, loader=odoo_load):
+    """ Loads a chunk (DataFrame or Payload) into model. If it fails, splits
+    the chunk into halves and loads them under savepoints, recursively,
+    until the offending rows are isolated. Halves keep their order, so do
+    hierarchies. Returns a list of (state, ids, msgs, Payload), one per
+    loaded part. Loads through loader, eg. odoo_create.
+    Public method. Can be scheduled into threads. Interface method. """
+    if not isinstance(chunk, Payload):
+        chunk = Payload.from_frame(chunk)
+    with env.cr.savepoint():
+        state, ids, msgs = loader(env, model, chunk)
+    if state == "success" or len(chunk) < 2:
+        return [(state, ids, msgs, chunk)]
+    half = len(chunk) // 2
+    return odoo_load_bisect(env, model, chunk[:half], loader) + odoo_load_bisect(
+        env, model, chunk[half:], loader
+    )
 
-    # Note: field_onchange is still ordered
-    def _apply_onchange(row):
-        for i, (cell, xid) in enumerate(zip(row, is_external_id)):
-            if xid and cell:
-                row[i] = env.ref(cell).id
-            else:
-                row[i] = cell
-        result = model.onchange(row, None, field_onchange)["value"]
-        for i in row.index:
-            if i not in result:
-                continue
-            # It's a m2o in client format
-            elif isinstance(result[i], tuple):
-                row[i] = result[i][0]
-            else:
-                row[i] = result[i]
-        return row
 
-    res = chunk.apply(_apply_onchange, axis=1, result_type="expand")
-    return res
+def odoo_create(env, model, chunk, xmlids=None):
+    """ Creates a chunk (typed Payload or DataFrame), indexed by external ids,
+    as new records of model through batched create() calls, and registers
+    their external ids through the ORM. Bypasses the per field conversions
+    of load(): values must be typed already. Relational columns take
+    database ids (/.id) or external ids (/id), comma separated for *2many
+    fields. Fails on external ids which exist already.
+    Public method. Can be scheduled into threads. Interface method. """
+    if not isinstance(chunk, Payload):
+        chunk = Payload.from_frame(chunk, typed=True)
+    pairs = [_xmlid_pair(extid) for extid in chunk.index]
+    try:
+        # Database errors only roll back the savepoint, and fail the batch
+        with env.cr.savepoint():
+            vals_list = _create_values(env, env[model], chunk, xmlids or XmlIdCache())
+            env.cr.execute(
+                "SELECT module, name FROM ir_model_data WHERE (module, name) IN %s",
+                (tuple(pairs),),
+            )
+            existing = [module + "." + name for module, name in env.cr.fetchall()]
+            if existing:
+                raise ValueError(
+                    "External ids exist already, load them without --raw: "
+                    + ", ".join(existing[:10])
+                )
+            records = _create(env[model], vals_list)
+            _create(
+                env["ir.model.data"],
+                [
+                    {
+                        "module": module,
+                        "name": name,
+                        "model": model,
+                        "res_id": res_id,
+                        "noupdate": False,
+                    }
+                    for (module, name), res_id in zip(pairs, records.ids)
+                ],
+            )
+    except Exception as e:  # As load() does, report failures as messages
+        return "failure", False, [{"type": "error", "message": "{}".format(e)}]
+    return "success", records.ids, []
+
+
+def _xmlid_pair(extid):
+    """ Returns (module, name) of an external id, as load() imports it """
+    return tuple(extid.split(".", 1)) if "." in extid else ("__import__", extid)
+
+
+def _create(klass, vals_list):
+    """ Creates records in batch, where the odoo version supports it """
+    if odoo.release.version_info[0] >= 12:
+        return klass.create(vals_list)
+    return klass.browse([klass.create(vals).id for vals in vals_list])
+
+
+def _create_values(env, klass, chunk, xmlids):
+    """ Returns the create() values of the rows of a typed Payload. Relational
+    columns get coerced into database ids, external ids are resolved in bulk. """
+    columns = []  # (position, field name, subfield, *2many)
+    for position, label in enumerate(chunk.fields[1:], 1):
+        fixed = odoo.models.fix_import_export_id_paths(label)
+        field = klass._fields[fixed[0]]
+        subfield = fixed[1] if len(fixed) == 2 else ""
+        columns.append((position, field.name, subfield, field.type.endswith("2many")))
+
+    def refs(value, many):
+        if not many:
+            return [value]
+        if isinstance(value, float) and value.is_integer():
+            value = int(value)  # A single id, read as a number
+        return _split(value)
+
+    xmlids.prefetch(
+        env,
+        [
+            ref
+            for row in chunk.rows
+            for position, _name, subfield, many in columns
+            if subfield == "id" and row[position]
+            for ref in refs(row[position], many)
+        ],
+    )
+    vals_list = []
+    for row in chunk.rows:
+        vals = {}
+        for position, name, subfield, many in columns:
+            value = row[position]
+            if subfield and value is not False:
+                ids = [
+                    xmlids.resolve(env, ref) if subfield == "id" else int(ref)
+                    for ref in refs(value, many)
+                ]
+                value = [(6, 0, ids)] if many else ids[0]
+            elif subfield and many:
+                value = [(6, 0, [])]
+            vals[name] = value
+        vals_list.append(vals)
+    return vals_list
+
+
+@contextmanager
+def _worker_env(env):
+    """ Yields a new environment on a dedicated cursor of env's database.
+    Commits on success, rolls back on failure. Use it to schedule
+    loading into threads. """
+    with odoo.api.Environment.manage():
+        registry = odoo.registry(env.cr.dbname)
+        with registry.cursor() as cr:
+            yield odoo.api.Environment(cr, env.uid, env.context)
+
+
+def _init_worker_process(dbname):
+    """ Detaches a forked worker process from its parent's database
+    connections, but keeps the inherited (warm) registry. Inherited
+    connections share their sockets with the parent: keep them referenced,
+    so they never get closed nor reused from within the worker. """
+    global _INHERITED_POOL  # pylint: disable=W0601
+    _INHERITED_POOL = odoo.sql_db._Pool  # pylint: disable=W0212
+    odoo.sql_db._Pool = None  # pylint: disable=W0212
+    registry = odoo.registry(dbname)
+    registry._db = odoo.sql_db.db_connect(dbname)  # pylint: disable=W0212
+
+
+def _flush_task(task):
+    """ Pool entry point. Forked processes inherit GRAPH, so tasks only
+    need to carry chunk indices. """
+    return GRAPH.flush_task(task)
+
+
+class XmlIdCache(object):
+    """ Bounded cache of external ids to database ids, evicting the least
+    recently used entries. Thread-safe. """
+
+    def __init__(self, size=XMLID_CACHE_SIZE):
+        self.size = size
+        self._ids = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, xmlid):
+        with self._lock:
+            res_id = self._ids.pop(xmlid, None)
+            if res_id is not None:
+                self._ids[xmlid] = res_id
+            return res_id
+
+    def update(self, pairs):
+        with self._lock:
+            for xmlid, res_id in pairs:
+                self._ids.pop(xmlid, None)
+                self._ids[xmlid] = res_id
+            while len(self._ids) > self.size:
+                self._ids.popitem(last=False)
+
+    def prefetch(self, env, xmlids):
+        """ Resolves all not yet cached xmlids within a single query """
+        missing = set()
+        for xmlid in set(xmlids):
+            if (
+                isinstance(xmlid, string_types)
+                and "." in xmlid
+                and self.get(xmlid) is None
+            ):
+                missing.add(tuple(xmlid.split(".", 1)))
+        if not missing:
+            return
+        env.cr.execute(
+            "SELECT module, name, res_id FROM ir_model_data "
+            "WHERE (module, name) IN %s",
+            (tuple(missing),),
+        )
+        self.update(
+            (module + "." + name, res_id) for module, name, res_id in env.cr.fetchall()
+        )
+
+    def resolve(self, env, xmlid):
+        """ Returns the database id of xmlid. Raises as env.ref does,
+        if the xmlid doesn't exist. """
+        res_id = self.get(xmlid)
+        if res_id is None:
+            res_id = env.ref(xmlid).id
+            self.update([(xmlid, res_id)])
+        return res_id
+
+
+def _peak_rss():
+    """ Returns the peak resident set size of the process in KiB, if known """
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Darwin reports bytes
+    return rss // 1024 if sys.platform == "darwin" else rss
+
+
+@contextmanager
+def _measure(records, stage, env, **record):
+    """ Measures wall time, SQL queries (of env's cursor) and peak RSS of
+    the wrapped block into a metrics record, which gets appended to the
+    records receiver. Yields the record, eg. to count rows on the go.
+    A no-op, if records is None. """
+    if records is None:
+        yield record
+        return
+    queries = getattr(env.cr, "sql_log_count", None)
+    start = timeit.default_timer()
+    try:
+        yield record
+    finally:
+        record.update(
+            stage=stage, seconds=timeit.default_timer() - start, peak_rss=_peak_rss()
+        )
+        if queries is not None:
+            record["queries"] = env.cr.sql_log_count - queries
+        records.append(record)
 
 
-def log_load_json(state, ids, extids, msgs, batch, model):
-    """ Logs load result into json chunk. Interface method. """
+def _write_metrics(metrics_stream, records):
+    """ Writes records into the metrics_stream reciever and clears them """
+    if records is None:
+        return
+    if metrics_stream:
+        for record in records:
+            metrics_stream.write(log_metrics_json(record))
+    del records[:]
+
+
+def _onchange(env, model, chunk, field_onchange, is_external_id, xmlids=None):
+    """ Applies onchanges on a chunk, as if its rows were entered through
+    forms. Onchange results depend on all values of a row, and only hold
+    what changed compared to them, so only rows with identical values share
+    the result of a single onchange call, which gets broadcast back onto all
+    of them. """
+    model = env[model]
+    xmlids = xmlids or XmlIdCache()
+    chunk = _plain(chunk)
+
+    # Coerce external ids to database ids, bulk resolved for the chunk
+    xid_cols = [col for col, xid in zip(chunk.columns, is_external_id) if xid]
+    xmlids.prefetch(env, pd.unique(chunk[xid_cols].values.ravel()))
+    for col in xid_cols:
+        resolved = {
+            cell: xmlids.resolve(env, cell)
+            for cell in chunk[col].unique()
+            if pd.notnull(cell) and cell
+        }
+        chunk[col] = chunk[col].map(lambda cell: resolved.get(cell, cell))
+
+    # Group on every column passed to onchange, nulls apart from ""
+    keys = chunk.astype(str)
+    codes = keys.groupby(list(keys.columns), sort=False).ngroup().values
+    _groups, firsts = np.unique(codes, return_index=True)
+
+    updates = []
+    for pos in firsts:
+        result = model.onchange(chunk.iloc[pos].to_dict(), None, field_onchange)
+        updates.append(
+            {
+                # It's a m2o in client format
+                name: value[0] if isinstance(value, tuple) else value
+                for name, value in viewitems(result["value"])
+                if name in chunk
+            }
+        )
+
+    # Broadcast, but only onto fields the group's onchange returned
+    for col in chunk.columns:
+        present = np.array([col in update for update in updates])[codes]
+        if not present.any():
+            continue
+        values = np.empty(len(updates), dtype=object)
+        values[:] = [update.get(col) for update in updates]
+        chunk[col] = np.where(present, values[codes], chunk[col].astype(object))
+    return chunk
+
+
+def log_load_json(state, ids, extids, msgs, batch, model, hashes=None):
+    """ Logs load result into a json line, with the content hashes of the
+    candidates, if given. Interface method. """
+    record = {
+        "batch": batch,
+        "candidates": extids,
+        "loaded": ids,
+        "model": model,
+        "state": state,
+        "x_msgs": msgs,
+    }
+    if hashes is not None:
+        record["hashes"] = hashes
+    return bytes(json.dumps(record, sort_keys=True) + "\n", "utf-8")
+
+
+def log_reject_json(fields, rows, msgs, batch, model):
+    """ Logs rejected rows into a json line. Interface method. """
     return bytes(
         json.dumps(
             {
                 "batch": batch,
-                "candidates": extids,
-                "loaded": ids,
+                "fields": fields,
                 "model": model,
-                "state": state,
+                "rows": rows,
                 "x_msgs": msgs,
             },
             sort_keys=True,
-            indent=4,
         )
-        + ",",
+        + "\n",
         "utf-8",
     )
 
 
+def log_metrics_json(record):
+    """ Logs a metrics record into a json line. Interface method. """
+    metrics = {"batch": None, "model": None, "queries": None, "rows": None}
+    metrics.update(record)
+    rows, seconds = metrics["rows"], metrics["seconds"]
+    metrics["rows_per_sec"] = rows / seconds if rows is not None and seconds else None
+    return bytes(json.dumps(metrics, sort_keys=True) + "\n", "utf-8")
+
+
+def log_checkpoint_json(batches):
+    """ Logs a checkpoint into a json line. Batches logged before it
+    are committed. Interface method. """
+    return bytes(
+        json.dumps({"checkpoint": batches, "state": "checkpoint"}, sort_keys=True)
+        + "\n",
+        "utf-8",
+    )
+
+
+def _batch_keys(length, batch, levels=None):
+    """ Returns the batch number of each of length rows. With levels,
+    batches are cut within levels, so they never span two of them. """
+    if levels is None:
+        return np.arange(length) // batch
+    starts = np.flatnonzero(np.diff(levels, prepend=-1))
+    # Position of each row within its level
+    positions = np.arange(length) - np.repeat(
+        starts, np.diff(np.append(starts, length))
+    )
+    return np.cumsum(positions % batch == 0) - 1
+
+
+class MetadataCache(object):
+    """ On-disk cache of model metadata, one json file per database and
+    model. Entries are keyed by a hash of the installed modules and their
+    versions, and of the manual fields, so that installs, upgrades and custom
+    fields invalidate them.
+    Without directory, metadata is only cached in memory. """
+
+    def __init__(self, directory, env):
+        self.directory = directory and os.path.join(directory, env.cr.dbname)
+        self.key = None
+        self._specs = {}
+        self.refresh(env)
+
+    def refresh(self, env):
+        """ Drops cached metadata, if the installed modules or the manual
+        fields changed. Returns whether they did. """
+        env.cr.execute(
+            "SELECT name, latest_version FROM ir_module_module "
+            "WHERE state = 'installed' ORDER BY name"
+        )
+        modules = env.cr.fetchall()
+        env.cr.execute(
+            "SELECT model, name, ttype, relation FROM ir_model_fields "
+            "WHERE state = 'manual' ORDER BY model, name"
+        )
+        fields = env.cr.fetchall()
+        key = hashlib.sha1(bytes(json.dumps([modules, fields]), "utf-8")).hexdigest()
+        changed = self.key is not None and key != self.key
+        if key != self.key:
+            self.key = key
+            self._specs = {}
+        return changed
+
+    def _path(self, model):
+        return os.path.join(self.directory, model + ".json")
+
+    def get(self, model):
+        if model not in self._specs and self.directory:
+            try:
+                with open(self._path(model), "rb") as f:
+                    # Keeps the order onchange flags were cached in
+                    entry = json.loads(
+                        f.read().decode("utf-8"), object_pairs_hook=OrderedDict
+                    )
+            except (IOError, ValueError):
+                entry = {}
+            self._specs[model] = entry["spec"] if entry.get("key") == self.key else None
+        return self._specs.get(model)
+
+    def put(self, model, spec):
+        """ Writes spec atomically, concurrent runs never read a torn file """
+        self._specs[model] = spec
+        if not self.directory:
+            return
+        if not os.path.isdir(self.directory):
+            try:
+                os.makedirs(self.directory)
+            except OSError:  # Created concurrently
+                pass
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(bytes(json.dumps({"key": self.key, "spec": spec}), "utf-8"))
+        os.rename(tmp, self._path(model))
+
+
+class InputCache(object):
+    """ On-disk cache of parsed and index-normalized DataFrames, one feather
+    file per DataFrame of an input, listed by a json entry per input.
+    Entries are keyed by a hash of the input content, its reader options,
+    and the versions of the loader and pandas. Feather files are read
+    memory-mapped. Beyond size bytes, the least recently used entries are
+    evicted. Needs pyarrow. """
+
+    def __init__(self, directory, size):
+        if not pa:
+            raise click.UsageError("--cache-dir needs pyarrow (arrow extra).")
+        self.directory = directory
+        self.size = size
+        if not os.path.isdir(directory):
+            try:
+                os.makedirs(directory)
+            except OSError:  # Created concurrently
+                pass
+
+    @staticmethod
+    def key(digest, input_type, model):
+        return hashlib.sha1(
+            bytes(
+                json.dumps(
+                    [
+                        INPUT_CACHE_FORMAT,
+                        _loader_version(),
+                        pd.__version__,
+                        digest,
+                        input_type,
+                        model,
+                    ]
+                ),
+                "utf-8",
+            )
+        ).hexdigest()
+
+    def _path(self, key, suffix):
+        return os.path.join(self.directory, key + suffix)
+
+    def get(self, key):
+        """ Returns [(model, DataFrame)] of a cached input, or None """
+        try:
+            with open(self._path(key, ".json"), "rb") as f:
+                models = json.loads(f.read().decode("utf-8"))
+            frames = []
+            for i, model in enumerate(models):
+                df = feather.read_table(
+                    self._path(key, "-{}.feather".format(i)), memory_map=True
+                ).to_pandas()
+                frames.append((model, df.set_index(df.columns[0])))
+            os.utime(self._path(key, ".json"), None)  # Recently used
+        except (EnvironmentError, ValueError, pa.ArrowException):
+            return None
+        return frames
+
+    def put(self, key, frames):
+        """ Writes the [(model, DataFrame)] of an input atomically, then
+        evicts entries beyond size. Skips inputs, that have no columnar
+        representation (eg. columns of mixed types). """
+        written = []
+        try:
+            for i, (_model, df) in enumerate(frames):
+                written.append(self._path(key, "-{}.feather".format(i)))
+                self._write(written[-1], df.reset_index())
+        except (TypeError, ValueError, pa.ArrowException) as e:
+            for path in written[:-1]:
+                os.remove(path)
+            _logger.info("Not caching input %s: %s", key, e)
+            return
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(bytes(json.dumps([model for model, _df in frames]), "utf-8"))
+        os.rename(tmp, self._path(key, ".json"))
+        self.evict()
+
+    def _write(self, path, df):
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        os.close(fd)
+        try:
+            feather.write_feather(df, tmp)
+        except Exception:
+            os.remove(tmp)
+            raise
+        os.rename(tmp, path)
+
+    def evict(self):
+        """ Removes least recently used entries, until they fit into size """
+        names = os.listdir(self.directory)
+        entries = []  # (last use, size, files)
+        for name in names:
+            if not name.endswith(".json"):
+                continue
+            key = name[: -len(".json")]
+            files = [os.path.join(self.directory, name)] + [
+                os.path.join(self.directory, other)
+                for other in names
+                if other.startswith(key + "-")
+            ]
+            try:
+                size = sum(os.path.getsize(path) for path in files)
+                entries.append((os.path.getmtime(files[0]), size, files))
+            except OSError:  # Evicted concurrently
+                continue
+        total = sum(size for _mtime, size, _files in entries)
+        for _mtime, size, files in sorted(entries):
+            if total <= self.size:
+                break
+            for path in files:  # The json entry first
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            total -= size
+
+
+def _loader_version():
+    """ Returns the installed version of the loader """
+    try:
+        import pkg_resources
+
+        return pkg_resources.get_distribution("dodoo-loader").version
+    except Exception:  # Not installed, eg. from a checkout
+        return None
+
+
+def _refs(column, many=False):
+    """ Returns the distinct, non-empty values of an external id column.
+    If many, cells hold comma-separated lists of external ids. """
+    cells = [cell for cell in column.dropna().unique() if cell != ""]
+    if not many:
+        return cells
+    return list(OrderedDict.fromkeys(ref for cell in cells for ref in _split(cell)))
+
+
+def _split(cell):
+    """ Returns the values of a comma-separated x2many cell """
+    return [value.strip() for value in "{}".format(cell).split(",") if value.strip()]
+
+
+def _qualified(refs):
+    """ Returns whether all refs are external ids qualified by a module """
+    return all(isinstance(ref, string_types) and "." in ref for ref in refs)
+
+
+def _hierarchy_levels(index, parents):
+    """ Returns the depth level of each row of a tree table, given its index
+    and its parent column values. Rows are integer-coded by position, so
+    levels are computed breadth first on arrays, level by level. Rows without
+    parent, or whose parent is not in the table, are roots. Raises on
+    duplicate ids and cycles. """
+    if not index.is_unique:
+        raise click.UsageError(
+            "Hierarchy tables need unique ids. Duplicates: {}".format(
+                ", ".join(str(i) for i in index[index.duplicated()][:10])
+            )
+        )
+    codes = index.get_indexer(parents)
+    # Children, grouped by parent position
+    children = np.argsort(codes, kind="mergesort")
+    sorted_codes = codes[children]
+
+    levels = np.full(len(index), -1, dtype=np.int64)
+    frontier, level = np.flatnonzero(codes == -1), 0
+    while len(frontier):
+        levels[frontier] = level
+        starts = np.searchsorted(sorted_codes, frontier, "left")
+        counts = np.searchsorted(sorted_codes, frontier, "right") - starts
+        # Concatenate the children ranges of all frontier rows
+        offsets = np.repeat(starts - np.cumsum(counts) + counts, counts)
+        frontier = children[offsets + np.arange(len(offsets))]
+        level += 1
+    if (levels == -1).any():
+        raise click.UsageError(
+            "Hierarchy tables must not contain cycles. Rows in or below a "
+            "cycle: {}".format(", ".join(str(i) for i in index[levels == -1][:10]))
+        )
+    return levels
+
+
 class DataSetGraph(nx.DiGraph):
     """ Holds DataFrames as nodes plus their metadata.
     Class-level functions (ordered) describe the processing stages."""
 
     def __init__(self, *args, **kwargs):
         self.env = kwargs.get("env", False)
+        # Run-wide cache, fed by onchange processing and load results
+        self.xmlids = XmlIdCache()
+        # Number of chunks committed under checkpoints
+        self.committed = 0
+        # Batch metrics summed up per node
+        self.totals = OrderedDict()
+        # {model: options} overriding the run's options, eg. from a manifest
+        self.model_options = {}
+        # Optional MetadataCache
+        self.metadata = None
+        # {model: {index: content hash}} of read rows, if incremental
+        self.hashes = None
         super(DataSetGraph, self).__init__(*args, **kwargs)
 
+    def _options(self, node):
+        """ Returns the options of node's model, which override the run's """
+        return self.model_options.get(self.nodes[node]["model"], {})
+
+    def _model_option_values(self, name):
+        return [opts[name] for opts in self.model_options.values() if name in opts]
+
+    @staticmethod
+    def _frame(data):
+        """ Returns a node's DataFrame, or the head chunk of lazy nodes """
+        return data["head"] if data.get("lazy") else data["df"]
+
     def load_metadata(self):
         """ Loads all required metadata from the odoo enviornment
-        for all nodes in the graph and normalizes column names"""
+        for all nodes in the graph and normalizes column names.
+        With a metadata cache, model metadata is read from it, as long as
+        the installed modules didn't change. """
         for _node, data in self.nodes(data=True):
             # Normalize column names, keep order
             data["cols"] = OrderedDict()
-            for col in data["df"].columns:
+            for col in self._frame(data).columns:
                 fixed = odoo.models.fix_import_export_id_paths(col)
                 subfield = fixed[1] if len(fixed) == 2 else ""
                 data["cols"][col] = {"name": fixed[0], "subfield": subfield}
@@ -138,32 +885,180 @@ class DataSetGraph(nx.DiGraph):
                     )
 
             klass = self.env[data["model"]]
-
-            data["fields"] = {"stored": [], "relational": []}
+            spec = self._model_spec(klass)
             # spec: {'relational': [{'name':'', 'model':''}]}
-            data["parent"] = klass._parent_name  # pylint: disable=W0212
-            data["repr"] = klass._description  # pylint: disable=W0212
-
-            for _name, field in klass._fields.items():
-                if field.store:
-                    data["fields"]["stored"].append(field)
-                if field.relational:
-                    data["fields"]["relational"].append(
-                        {"name": field.name, "model": field.comodel_name}
-                    )
+            data["fields"] = {"relational": spec["relational"]}
+            data["parent"] = spec["parent"]
+            data["repr"] = spec["repr"]
 
             # Enrich cols with data from odoo env (convenience)
             _colnames = [col["name"] for col in data["cols"].values()]
+            flags = self._onchange_flags(klass, spec, _colnames)
             for col in data["cols"].values():
-                col["onchange"] = (
-                    "1"
-                    if klass._has_onchange(klass._fields[col["name"]], _colnames)
-                    else ""
-                )
+                col["onchange"] = flags[col["name"]]
                 for rel in data["fields"]["relational"]:
                     if col["name"] == rel["name"]:
                         col["model"] = rel["model"]
 
+    def _model_spec(self, klass):
+        """ Returns the metadata spec of klass, from the metadata cache
+        if there is one """
+        spec = self.metadata.get(klass._name) if self.metadata else None
+        if spec:
+            return spec
+        spec = {
+            "parent": klass._parent_name,  # pylint: disable=W0212
+            "repr": klass._description,  # pylint: disable=W0212
+            "relational": [],
+            "onchange": OrderedDict(),
+        }
+        for field in klass._fields.values():
+            if field.relational:
+                spec["relational"].append(
+                    {"name": field.name, "model": field.comodel_name}
+                )
+        if self.metadata:
+            self.metadata.put(klass._name, spec)
+        return spec
+
+    def _onchange_flags(self, klass, spec, colnames):
+        """ Returns {colname: flag} of the columns triggering onchanges.
+        Flags depend on all columns present, so they are cached per set of
+        columns, up to ONCHANGE_FLAGS_CACHE_SIZE sets per model. """
+        key = ",".join(sorted(colnames))
+        if key not in spec["onchange"]:
+            spec["onchange"][key] = {
+                name: "1" if klass._has_onchange(klass._fields[name], colnames) else ""
+                for name in colnames
+            }
+            # Evict the sets of columns cached first
+            while len(spec["onchange"]) > ONCHANGE_FLAGS_CACHE_SIZE:
+                spec["onchange"].pop(next(iter(spec["onchange"])))
+            if self.metadata:
+                self.metadata.put(klass._name, spec)
+        return spec["onchange"][key]
+
+    def resolve_ids(self):
+        """ Resolves the external ids of relational columns into database
+        ids and rewrites those columns to /.id, so that load() doesn't look
+        them up row by row. Ids are collected across all nodes and resolved
+        with a single query per comodel. Missing references raise before
+        anything loads (or, for lazy nodes, once their chunk is read).
+
+        Parent columns and columns referring to models loaded within this
+        run are skipped, as their ids might not exist yet. So are columns
+        with ids not qualified by a module. Cells of x2many columns hold
+        comma-separated ids, and are rewritten to comma-separated database
+        ids. """
+        loading = {model for _node, model in self.nodes(data="model")}
+        columns = {}  # {node: {col: (comodel, many)}}
+        for node, data in self.nodes(data=True):
+            frame, fields = self._frame(data), self.env[data["model"]]._fields
+            for col, spec in data["cols"].items():
+                if (
+                    spec["subfield"] != "id"
+                    or not spec.get("model")
+                    or spec["name"] == data["parent"]
+                    or spec["model"] in loading
+                ):
+                    continue
+                many = fields[spec["name"]].type != "many2one"
+                if _qualified(_refs(frame[col], many)):
+                    columns.setdefault(node, {})[col] = (spec["model"], many)
+
+        # Query once per comodel, for all nodes
+        resolved, pending = {}, {}
+        for node, cols in columns.items():
+            self._pending_refs(self._frame(self.nodes[node]), cols, resolved, pending)
+        for comodel, refs in pending.items():
+            resolved.update(self._resolve_refs(comodel, refs))
+
+        for node, cols in columns.items():
+            data = self.nodes[node]
+            if data.get("lazy"):
+                data["head"] = self._rewrite_refs(data["head"], cols, resolved)
+                data["chunks"] = (
+                    self._rewrite_refs(chunk, cols, resolved)
+                    for chunk in data["chunks"]
+                )
+            else:
+                data["df"] = self._rewrite_refs(data["df"], cols, resolved)
+            data["cols"] = OrderedDict(
+                (spec["name"] + "/.id", dict(spec, subfield=".id"))
+                if col in cols
+                else (col, spec)
+                for col, spec in data["cols"].items()
+            )
+
+    @staticmethod
+    def _pending_refs(frame, cols, resolved, pending):
+        """ Collects refs of the {col: (comodel, many)} columns of frame,
+        which are not resolved yet, into the {comodel: set(refs)} pending
+        receiver """
+        for col, (comodel, many) in cols.items():
+            pending.setdefault(comodel, set()).update(
+                ref for ref in _refs(frame[col], many) if ref not in resolved
+            )
+
+    def _resolve_refs(self, comodel, refs):
+        """ Returns {xmlid: database id} of refs to comodel, resolved within a
+        single query. Raises on missing references. """
+        if not refs:
+            return {}
+        self.env.cr.execute(
+            "SELECT module, name, res_id FROM ir_model_data "
+            "WHERE model = %s AND (module, name) IN %s",
+            (comodel, tuple(tuple(ref.split(".", 1)) for ref in refs)),
+        )
+        found = {
+            module + "." + name: res_id
+            for module, name, res_id in self.env.cr.fetchall()
+        }
+        missing = sorted(set(refs) - set(found))
+        if missing:
+            raise click.UsageError(
+                "{count} missing references to {comodel}: {refs}".format(
+                    count=len(missing), comodel=comodel, refs=", ".join(missing[:10])
+                )
+            )
+        self.xmlids.update(viewitems(found))
+        return found
+
+    def _rewrite_refs(self, frame, cols, resolved):
+        """ Rewrites the {col: (comodel, many)} external id columns of frame
+        to database ids. Refs not found in resolved are resolved on the go:
+        as columns were chosen on their first chunk, later chunks can still
+        hold ids not qualified by a module, which raise. """
+        pending = {}
+        self._pending_refs(frame, cols, resolved, pending)
+        for comodel, refs in pending.items():
+            unqualified = sorted(
+                "{}".format(ref) for ref in refs if not _qualified([ref])
+            )
+            if unqualified:
+                raise click.UsageError(
+                    "External ids to {comodel} need a module, when resolved "
+                    "up front: {refs}".format(
+                        comodel=comodel, refs=", ".join(unqualified[:10])
+                    )
+                )
+            resolved.update(self._resolve_refs(comodel, refs))
+        for col, (_comodel, many) in cols.items():
+            if many:
+                values = [
+                    ",".join("{}".format(resolved[ref]) for ref in _split(cell)) or None
+                    for cell in frame[col].fillna("")
+                ]
+            else:
+                values = [resolved.get(ref) for ref in frame[col]]
+            frame[col] = pd.Series(values, index=frame.index, dtype=object)
+        return frame.rename(
+            columns={
+                col: odoo.models.fix_import_export_id_paths(col)[0] + "/.id"
+                for col in cols
+            }
+        )
+
     def seed_edges(self):
         """ Seeds the edges based on the df columns relations
         and existing models in the graph """
@@ -175,7 +1070,9 @@ class DataSetGraph(nx.DiGraph):
 
     def order_to_parent(self):
         """ Reorganizes dataframes for parent fields so they are in
-        suitable loading order. Does not support nested rows. """
+        suitable loading order: level by level, from the roots down.
+        The sorted depth level of each row is stored back as levels.
+        Does not support nested rows. """
         for _node, data in self.nodes(data=True):
             parent_col = [
                 col for col in data["cols"].values() if col["name"] == data["parent"]
@@ -183,104 +1080,468 @@ class DataSetGraph(nx.DiGraph):
             if not parent_col:
                 continue
             parent_col = parent_col[0]
-            idx = data["df"].index.name
+            idx = self._frame(data).index.name
 
             # We can only infer parent dependency if id and parent_id column
             # are in the same format (eg .id & /.id or id & /id)
             if parent_col["subfield"] != idx:
                 continue
 
-            parent = parent_col["name"] + "/" + parent_col["subfield"]
-            record_graph = nx.DiGraph()
+            # Reordering needs the whole table
+            if data.pop("lazy", False):
+                data["df"] = pd.concat([data.pop("head")] + list(data.pop("chunks")))
 
-            record_graph.add_nodes_from(data["df"].index.tolist())
-            record_graph.add_edges_from(
-                viewitems(data["df"][parent][data["df"][parent].notnull()])
-            )
-            data["df"] = data["df"].reindex(
-                nx.topological_sort(record_graph.reverse(True))
-            )
-
-    def chunk_dataframes(self, batch):
+            parent = parent_col["name"] + "/" + parent_col["subfield"]
+            levels = _hierarchy_levels(data["df"].index, data["df"][parent].values)
+            # Stable: rows keep their order within levels
+            order = np.argsort(levels, kind="mergesort")
+            data["df"] = data["df"].iloc[order]
+            data["levels"] = levels[order]
+            data["hierarchy"] = True
+
+    def chunk_dataframes(self, batch, serialize=False, target=0, typed=False):
         """ Chunks dataframes as per provided batch size.
         Resulting DFs are stored back as []DataFrame on the node.
+        Lazy nodes come already chunked by their reader and are just
+        iterated over.
+
+        If serialize, DataFrames are converted into load() format in a single
+        pass and stored back as []Payload, instead. Use it, unless chunks
+        still need processing as DataFrames (eg. onchanges).
+
+        If target, batch is just the probe size: nodes get a BatchSizer and
+        their chunks are cut lazily, as they get flushed, at the size it
+        adapted to the previous batches. Hierarchy tables keep the
+        static batch size.
+
+        If typed, Payloads keep their python values for create(), instead of
+        load() strings. Nodes must then be indexed by external ids.
+
+        Model options override batch and, with their onchange flag,
+        serialize.
+
+        Hierarchy tables are cut within their depth levels: their batches
+        never span two levels, so each level comes in waves of batches.
+        The level of each batch is stored back as waves.
 
         Note:
-            Don't attempt to schedule Hierarchy tables across threads: we
-            deliberately refrain from implementing a federated data chunk
-            dependency lock. This is usually not a problem, as hierarchy tables
-            tend to be relatively small in size and simple in datastructure.
+            Batches of the same level don't depend on each other, so waves
+            can be spread across threads, as long as each one is committed
+            before the next one starts: no chunk dependency lock is needed.
         """
-        for _node, data in self.nodes(data=True):
+        run_batch, run_serialize = batch, serialize
+        for node, data in self.nodes(data=True):
+            opts = self._options(node)
+            batch = opts.get("batch", run_batch)
+            serialize = not opts["onchange"] if "onchange" in opts else run_serialize
+            if typed and self._frame(data).index.name != "id":
+                raise click.UsageError(
+                    "--raw needs an id column of external ids in {}.".format(
+                        data["repr"]
+                    )
+                )
+            if target and not data.get("hierarchy"):
+                if data.get("lazy"):
+                    frames = itertools.chain([data.pop("head")], data.pop("chunks"))
+                else:
+                    frames = [data.pop("df")]
+                data["sizer"] = BatchSizer(batch, target)
+                data["chunked_iterable"] = enumerate(
+                    _rechunk(
+                        (
+                            Payload.from_frame(frame, typed) if serialize else frame
+                            for frame in frames
+                        ),
+                        data["sizer"],
+                    )
+                )
+                data["batchlen"] = "?"
+                continue
+            if data.get("lazy"):
+                data["chunked_iterable"] = enumerate(
+                    Payload.from_frame(chunk, typed) if serialize else chunk
+                    for chunk in itertools.chain([data.pop("head")], data.pop("chunks"))
+                    if len(chunk)
+                )
+                data["batchlen"] = "?"
+                continue
+            keys = _batch_keys(len(data["df"]), batch, data.get("levels"))
+            if "levels" in data:
+                data["waves"] = data.pop("levels")[
+                    np.unique(keys, return_index=True)[1]
+                ]
+            if serialize:
+                payload = Payload.from_frame(data.pop("df"), typed)
+                starts = np.flatnonzero(np.diff(keys, prepend=-1))
+                stops = np.append(starts[1:], len(payload))
+                data["chunked_iterable"] = [
+                    (i, payload[start:stop])
+                    for i, (start, stop) in enumerate(zip(starts, stops))
+                ]
+                data["batchlen"] = len(data["chunked_iterable"])
+                continue
             # https://stackoverflow.com/a/25703030
             # returns an iterable over (key, group)
-            data["chunked_iterable"] = data["df"].groupby(
-                np.arange(len(data["df"])) // batch
-            )
+            data["chunked_iterable"] = data["df"].groupby(keys)
+            data["batchlen"] = len(data["chunked_iterable"])
             del data["df"]
             # force gc collection as allocated memory
             # chunks might non-negligable.
             gc.collect()
 
-    def flush_all(self, onchange, log_stream=None):
-        """ Synchronously flushes all DataSetGraph's chunks in topo-sorted
-        order into their respective model. Writes return state as json into
-        the log_buf reciever """
-        for node in nx.topological_sort(self.reverse(False)):
-            batchlen = len(self.nodes[node]["chunked_iterable"])
-            field_onchange = OrderedDict()
-            is_external_id = []
+    def generations(self):
+        """ Returns nodes grouped into generations of loading order.
+        Nodes within a generation don't depend on each other, so they can
+        be loaded concurrently. Each generation acts as a barrier to the
+        next one. """
+        graph = self.reverse(False)
+        level = {}
+        for node in nx.topological_sort(graph):
+            level[node] = max([level[n] + 1 for n in graph.predecessors(node)] or [0])
+        generations = [[] for _i in range(max(level.values() or [-1]) + 1)]
+        for node in nx.topological_sort(graph):
+            generations[level[node]].append(node)
+        return generations
+
+    def flush_batch(
+        self, env, node, batch, df, onchange, bisect=False, raw=False, records=None
+    ):
+        """ Flushes a single chunk of node into its model through env.
+        With bisect, failing chunks are split until offending rows are
+        isolated. With raw, chunks are created through odoo_create instead
+        of load(). Returns a list of loaded parts as
+        (state, ids, extids, msgs, rejected), where rejected holds the
+        load() fields and rows of failed parts.
+        Metrics of the batch and its onchange and load stages are appended
+        to the records receiver, if given.
+        Model options override onchange and chatter. """
+        data, opts = self.nodes[node], self._options(node)
+        model, batchlen = data["model"], data["batchlen"]
+        onchange = opts.get("onchange", onchange)
+        if "chatter" in opts:
+            env = env.with_context(tracking_disable=not opts["chatter"])
+        with _measure(records, "batch", env, model=model, batch=batch, rows=len(df)):
+            _logger.info(
+                "Loading %s (%s), batch %s/%s.",
+                data["repr"],
+                model,
+                batch + 1,
+                batchlen,
+            )
+            if onchange:
+                field_onchange = OrderedDict()
+                is_external_id = []
 
-            # cols are still in their df column order
-            for col in self.nodes[node]["cols"].values():
-                field_onchange[col["name"]] = col["onchange"]
-                is_external_id.append(col["subfield"] == "id")
+                # cols are still in their df column order
+                for col in data["cols"].values():
+                    field_onchange[col["name"]] = col["onchange"]
+                    is_external_id.append(col["subfield"] == "id")
 
-            for batch, df in self.nodes[node]["chunked_iterable"]:
                 _logger.info(
-                    "Synchronously loading %s (%s), batch %s/%s.",
-                    self.nodes[node]["repr"],
-                    self.nodes[node]["model"],
+                    "Applying onchanges on %s (%s), batch %s/%s.",
+                    data["repr"],
+                    model,
                     batch + 1,
                     batchlen,
                 )
-                if onchange:
-                    _logger.info(
-                        "Applying onchanges on %s (%s), batch %s/%s.",
-                        self.nodes[node]["repr"],
-                        self.nodes[node]["model"],
-                        batch + 1,
-                        batchlen,
-                    )
-                    # Coerce to database Ids columns
-                    _coreced = [
-                        colname.replace("/id", "/.id") for colname in df.columns
-                    ]
-                    _cleaned = [
-                        colname.replace("/id", "").replace("/.id", "")
-                        for colname in df.columns
-                    ]
-                    df.columns = _cleaned
+                # Coerce to database Ids columns
+                _coreced = [colname.replace("/id", "/.id") for colname in df.columns]
+                _cleaned = [
+                    colname.replace("/id", "").replace("/.id", "")
+                    for colname in df.columns
+                ]
+                df.columns = _cleaned
+                with _measure(
+                    records, "onchange", env, model=model, batch=batch, rows=len(df)
+                ):
                     df = _onchange(
-                        self.env,
-                        self.nodes[node]["model"],
-                        df,
-                        field_onchange,
-                        is_external_id,
+                        env, model, df, field_onchange, is_external_id, self.xmlids
                     )
-                    df.columns = _coreced
-                state, ids, msgs = odoo_load(self.env, self.nodes[node]["model"], df)
-                if log_stream:
-                    log_stream.write(
-                        log_load_json(
-                            state,
-                            ids,
-                            df.index.tolist(),
-                            msgs,
-                            batch,
-                            self.nodes[node]["model"],
+                df.columns = _coreced
+            if not isinstance(df, Payload):
+                df = Payload.from_frame(df, raw)
+            loader = (
+                functools.partial(odoo_create, xmlids=self.xmlids) if raw else odoo_load
+            )
+            with _measure(records, "load", env, model=model, batch=batch, rows=len(df)):
+                if bisect:
+                    parts = odoo_load_bisect(env, model, df, loader)
+                else:
+                    parts = [loader(env, model, df) + (df,)]
+            if df.fields[0] == "id":
+                for state, ids, _msgs, part in parts:
+                    if state == "success" and len(ids) == len(part):
+                        self.xmlids.update(
+                            (xmlid, res_id)
+                            for xmlid, res_id in zip(part.index, ids)
+                            if isinstance(xmlid, string_types) and "." in xmlid
                         )
-                    )
+        return [
+            (
+                state,
+                ids,
+                part.index,
+                msgs,
+                (part.fields, part.rows) if state == "failure" else None,
+            )
+            for state, ids, msgs, part in parts
+        ]
+
+    def flush_task(self, task):
+        """ Flushes a sequence of chunks of one node on a dedicated
+        cursor. Runs inside a worker thread or process.
+        Commits every commit_every chunks, if set.
+        Returns (node, [(batch, parts, metrics records)]). """
+        node, chunks, options, commit_every = task
+        chunked_iterable = self.nodes[node]["chunked_iterable"]
+        results = []
+        with _worker_env(self.env) as env:
+            for batch, df in chunks:
+                if df is None and isinstance(chunked_iterable, list):
+                    df = chunked_iterable[batch][1]
+                elif df is None:
+                    df = chunked_iterable.get_group(batch)
+                records = []
+                parts = self.flush_batch(
+                    env, node, batch, df, records=records, **options
+                )
+                results.append((batch, parts, records))
+                if commit_every and not len(results) % commit_every:
+                    env.cr.commit()
+        return node, results
+
+    def _depth(self, generation):
+        """ Returns the number of levels of the deepest hierarchy table
+        within generation """
+        return max(
+            [
+                int(self.nodes[node]["waves"].max()) + 1
+                for node in generation
+                if len(self.nodes[node].get("waves", []))
+            ]
+            or [1]
+        )
+
+    def _tasks(self, generation, options, workers, commit_every, wave=0):
+        """ Yields flush tasks of a generation as
+        (node, chunks, options, commit_every).
+        Chunks of materialized nodes are referenced by batch number only
+        (df is None), chunks of lazy or adaptive nodes are read or cut as
+        they get scheduled.
+        Hierarchy tables only yield the batches of their level wave, all
+        other nodes yield their batches with the first wave.
+        Tasks span at most commit_every chunks. Model options override
+        workers and commit_every. """
+        for node in generation:
+            data, opts = self.nodes[node], self._options(node)
+            every = opts.get("commit_every", commit_every)
+            if "waves" in data:
+                batches = np.flatnonzero(data["waves"] == wave).tolist()
+            elif wave:
+                continue
+            elif data.get("lazy") or data.get("sizer"):
+                for batch, df in data["chunked_iterable"]:
+                    yield node, [(batch, df)], options, every
+                continue
+            else:
+                batches = range(data["batchlen"])
+            lanes = opts.get("workers", workers)
+            chunks = [(batch, None) for batch in batches]
+            if not chunks:
+                continue
+            size = every or len(chunks)
+            for lane in range(lanes):
+                lane_chunks = chunks[lane::lanes]
+                for i in range(0, len(lane_chunks), size):
+                    yield node, lane_chunks[i : i + size], options, every
+
+    def _log(self, streams, node, batch, parts):
+        log_stream, reject_stream = streams
+        model = self.nodes[node]["model"]
+        for state, ids, extids, msgs, rejected in parts:
+            hashes = None
+            if self.hashes is not None and state == "success":
+                known = self.hashes.get(model, {})
+                hashes = [known.get(extid) for extid in extids]
+            if log_stream:
+                log_stream.write(
+                    log_load_json(state, ids, extids, msgs, batch, model, hashes)
+                )
+            if reject_stream and rejected:
+                fields, rows = rejected
+                reject_stream.write(log_reject_json(fields, rows, msgs, batch, model))
+
+    def _observe(self, node, parts, records):
+        """ Feeds the duration and outcome of a batch (as per its metrics
+        records) back into the sizer of node, if it has one """
+        sizer = self.nodes[node].get("sizer")
+        if not sizer:
+            return
+        failed = any(part[0] == "failure" for part in parts)
+        for record in records:
+            if record["stage"] == "batch":
+                sizer.observe(record["rows"], record["seconds"], failed)
+
+    def _measured(self, metrics_stream, node, records):
+        """ Writes the metrics records of a batch and sums them up into the
+        totals of node """
+        total = self.totals.setdefault(
+            node,
+            {
+                "model": self.nodes[node]["model"],
+                "queries": 0,
+                "rows": 0,
+                "seconds": 0.0,
+                "stage": "node",
+            },
+        )
+        for record in records:
+            if record["stage"] == "batch":
+                total["rows"] += record["rows"]
+                total["seconds"] += record["seconds"]
+                total["queries"] += record.get("queries") or 0
+        _write_metrics(metrics_stream, records)
+
+    def _checkpoint(self, streams, pending):
+        """ Logs the committed (node, batch, parts) of pending together with
+        a checkpoint record in a single write, and syncs it to disk. """
+        log_stream, reject_stream = streams
+        self.committed += len(pending)
+        buf = io.BytesIO()
+        for node, batch, parts in pending:
+            self._log((buf, reject_stream), node, batch, parts)
+        del pending[:]
+        if not log_stream:
+            return
+        buf.write(log_checkpoint_json(self.committed))
+        log_stream.write(buf.getvalue())
+        log_stream.flush()
+        os.fsync(log_stream.fileno())
+
+    def flush_all(
+        self,
+        onchange,
+        log_stream=None,
+        workers=1,
+        processes=False,
+        bisect=False,
+        reject_stream=None,
+        commit_every=0,
+        metrics_stream=None,
+        raw=False,
+    ):
+        """ Flushes all DataSetGraph's chunks in topo-sorted order into their
+        respective model. Writes return state as json into the log_buf
+        reciever and rows of failed chunks into the reject_stream reciever.
+        With bisect, failed chunks are split to load all valid rows.
+        With raw, chunks are created through odoo_create instead of load().
+
+        With commit_every, commits every so many chunks. Their results are
+        only logged after the commit, followed by a checkpoint, so that the
+        log never runs ahead of the database.
+
+        With more than one worker, chunks of all nodes within a generation
+        are loaded concurrently, each worker on its own cursor. Hierarchy
+        tables load level by level: the chunks of a level concurrently, once
+        the previous level is committed.
+        Workers are threads, or forked processes if processes is set.
+
+        Metrics of each batch are written into the metrics_stream reciever
+        as they get flushed, followed by their totals per node. Node wall
+        times are summed up over batches, so concurrent batches add up.
+
+        Model options override workers and commit_every per node. The pool
+        is sized for the largest number of workers. """
+        options = {"onchange": onchange, "bisect": bisect, "raw": raw}
+        streams = (log_stream, reject_stream)
+        if max([workers] + self._model_option_values("workers")) > 1:
+            self._flush_parallel(
+                options, streams, workers, processes, commit_every, metrics_stream
+            )
+        else:
+            self._flush_sequential(options, streams, commit_every, metrics_stream)
+        totals = list(self.totals.values())
+        for total in totals:
+            total["peak_rss"] = _peak_rss()
+        _write_metrics(metrics_stream, totals)
+
+    def _flush_sequential(self, options, streams, commit_every, metrics_stream):
+        pending = []  # Flushed, but not yet committed
+        records = []
+        checkpoints = commit_every or any(self._model_option_values("commit_every"))
+        for node in nx.topological_sort(self.reverse(False)):
+            every = self._options(node).get("commit_every", commit_every)
+            for batch, df in self.nodes[node]["chunked_iterable"]:
+                parts = self.flush_batch(
+                    self.env, node, batch, df, records=records, **options
+                )
+                self._observe(node, parts, records)
+                self._measured(metrics_stream, node, records)
+                if not checkpoints:
+                    self._log(streams, node, batch, parts)
+                    continue
+                pending.append((node, batch, parts))
+                if every and len(pending) >= every:
+                    self.env.cr.commit()
+                    self._checkpoint(streams, pending)
+        if pending:
+            self.env.cr.commit()
+            self._checkpoint(streams, pending)
+
+    def _flush_parallel(
+        self, options, streams, workers, processes, commit_every, metrics_stream
+    ):
+        """ Schedules chunks generation by generation into a pool of
+        workers. Within a generation, each level of its hierarchy tables is a
+        barrier. Worker cursors commit when their task is done, results
+        get logged from the main process and thread only. """
+        size = max([workers] + self._model_option_values("workers"))
+        if processes:
+            pool = _fork_context().Pool(
+                size, initializer=_init_worker_process, initargs=(self.env.cr.dbname,)
+            )
+        else:
+            pool = ThreadPool(size)
+        try:
+            phases = (
+                (generation, wave)
+                for generation in self.generations()
+                for wave in range(self._depth(generation))
+            )
+            for generation, wave in phases:
+                tasks = self._tasks(generation, options, workers, commit_every, wave)
+                # Schedule in windows, so lazy nodes aren't read all at once
+                window = list(itertools.islice(tasks, 2 * size))
+                while window:
+                    for node, results in pool.imap_unordered(_flush_task, window):
+                        for _batch, parts, records in results:
+                            self._observe(node, parts, records)
+                            self._measured(metrics_stream, node, records)
+                        if self._options(node).get("commit_every", commit_every):
+                            # Worker cursors have committed already
+                            self._checkpoint(
+                                streams,
+                                [
+                                    (node, batch, parts)
+                                    for batch, parts, _records in results
+                                ],
+                            )
+                            continue
+                        for batch, parts, _records in results:
+                            self._log(streams, node, batch, parts)
+                    window = list(itertools.islice(tasks, 2 * size))
+        finally:
+            pool.close()
+            pool.join()
+
+
+def _fork_context():
+    """ Returns a multiprocessing context which forks workers, so they
+    inherit the loaded graph and the registry. """
+    try:
+        return multiprocessing.get_context("fork")
+    except AttributeError:  # python 2 always forks
+        return multiprocessing
 
 
 def _infer_valid_model(filename):
@@ -296,65 +1557,547 @@ def _infer_valid_model(filename):
         return False
 
 
-def _log_retrieve_loaded_indices(out, model):
+def _log_parse_legacy(content):
+    """ Parses a log of the former json array format. Interrupted runs
+    might have left it unterminated. """
+    content = content.strip().rstrip(",")
+    if not content.endswith("]"):
+        content += "]"
+    return [record for record in json.loads(content) if record]
+
+
+def _log_retrieve_loaded_indices(out):
+    """ Reads the whole --out log once. Returns the indices of loaded
+    records by model, with the content hash they were last loaded with, if
+    logged, as {model: {index: hash}}. Logs of the former json array
+    format are converted to json lines in place. """
     out.seek(0)
-    data = json.loads(out.read().decode("utf-8"))[:-1]
-    data[:] = (x for x in data if x["model"] == model and x["loaded"])
-    return [c for batch in data for c in batch["candidates"]]
+    content = out.read().decode("utf-8")
+    if content.lstrip().startswith("["):
+        records = _log_parse_legacy(content)
+        out.seek(0)
+        out.truncate()
+        for record in records:
+            out.write(bytes(json.dumps(record, sort_keys=True) + "\n", "utf-8"))
+    else:
+        records = []
+        for line in content.splitlines():
+            if not line.strip():
+                continue
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                # Torn write of an interrupted run
+                _logger.warning("Skipping unreadable log line: %s", line[:80])
+        if content and not content.endswith("\n"):
+            # Terminate a torn line, so that appending starts on a new one
+            out.write(bytes("\n", "utf-8"))
+    loaded = {}
+    for record in records:
+        if record.get("loaded"):
+            hashes = record.get("hashes") or [None] * len(record["candidates"])
+            loaded.setdefault(record["model"], {}).update(
+                zip(record["candidates"], hashes)
+            )
+    return loaded
 
 
-def _load_dataframes(buf, input_type, model, out):
-    """ Loads dataframes into the GRAPH global receiver """
-    # out = None
+def _prepare_dataframe(df, loaded):
+    """ Sets the index column of a DataFrame and drops rows without index
+    or with an index that was already loaded. """
+    return _drop_loaded(_index_dataframe(df), loaded)
 
-    def _load_into_graph(df, mod):
-        if "id" in df.columns:
-            idx = "id"
-        if ".id" in df.columns:
-            idx = ".id"
-        if not idx:
-            raise click.UsageError(
-                "You need to provide an index column:" "\t'id' or '.id' are supported"
+
+def _index_dataframe(df):
+    """ Sets the index column of a DataFrame and drops rows without index """
+    idx = None
+    if "id" in df.columns:
+        idx = "id"
+    if ".id" in df.columns:
+        idx = ".id"
+    if not idx:
+        raise click.UsageError(
+            "You need to provide an index column:" "\t'id' or '.id' are supported"
+        )
+    # Drop lines with empty or NaN index column
+    df = df[df[idx] != ""][  # Filter out empty strings
+        ~df[idx].isnull()  # Filter out none-set values (eg. in json)
+    ]
+    df.set_index(idx, inplace=True)
+    return df
+
+
+def _drop_loaded(df, loaded, hashes=None):
+    """ Drops rows of an indexed DataFrame, that were already loaded as per
+    the {index: hash} mapping loaded. Given the content hashes of its rows,
+    only drops rows loaded with the same hash: changed rows are kept. """
+    if not loaded:
+        return df
+    # Dict lookups: cost is proportional to the input, not to the log
+    if hashes is None:
+        keep = (i not in loaded for i in df.index)
+    else:
+        keep = (loaded.get(i) != h for i, h in zip(df.index, hashes))
+    return df[np.fromiter(keep, bool, len(df))]
+
+
+def _row_hashes(df):
+    """ Returns the content hashes of the rows of an indexed DataFrame as hex
+    strings. Hashes cover the canonical text of the values and the column
+    names, not the column order, nor the dtypes pandas inferred. """
+    columns = sorted(df.columns)
+    header = hashlib.sha1(bytes(json.dumps(columns), "utf-8")).hexdigest()
+    if columns:
+        text = pd.DataFrame(
+            OrderedDict((col, _canonical(df[col])) for col in columns), columns=columns
+        )
+        hashes = pd.util.hash_pandas_object(text, index=False).values
+    else:
+        hashes = np.zeros(len(df), dtype=np.uint64)
+    hashes = hashes ^ np.uint64(int(header[:16], 16))
+    return ["{:016x}".format(h) for h in hashes]
+
+
+def _canonical(column):
+    """ Returns the values of a column as text, alike whatever dtype pandas
+    inferred for it, eg. per file or per chunk: nulls are empty, and
+    integral floats (integers with gaps) are written as integers. """
+    nulls = np.asarray(column.isnull())
+    text = np.asarray(column.astype(str), dtype=object)
+    if column.dtype.kind == "f":
+        values = np.asarray(column.fillna(0), dtype=float)  # Nulls get emptied
+        integral = np.isfinite(values) & (values == np.floor(values))
+        text[integral] = values[integral].astype(np.int64).astype(str)
+    text[nulls] = ""
+    return text
+
+
+def _field_dtypes(klass, columns):
+    """ Returns {column: dtype} of the columns of klass, that get a dtype
+    of their own, as per their odoo field type:
+
+    * external ids of many2one fields and selections: category
+    * database ids and integers: nullable Int64
+    * floats and monetaries: float64
+    * dates: naive datetime64, datetimes: UTC datetime64
+
+    Parent columns keep their values, as hierarchies get ordered on them. """
+    dtypes = {}
+    for col in columns:
+        fixed = odoo.models.fix_import_export_id_paths(col)
+        field = klass._fields.get(fixed[0])
+        if not field or field.name == klass._parent_name:
+            continue
+        subfield = fixed[1] if len(fixed) == 2 else ""
+        if subfield == "id" and field.type == "many2one":
+            dtypes[col] = "category"
+        elif subfield == ".id" and field.type == "many2one":
+            dtypes[col] = "Int64"
+        elif subfield:
+            continue
+        elif field.type == "selection":
+            dtypes[col] = "category"
+        elif field.type == "integer":
+            dtypes[col] = "Int64"
+        elif field.type in ("float", "monetary"):
+            dtypes[col] = "float64"
+        elif field.type in ("date", "datetime"):
+            dtypes[col] = field.type
+    return dtypes
+
+
+def _typed_dataframe(df, klass):
+    """ Converts the columns of df into the dtypes of their odoo fields.
+    Columns, that don't convert, keep their values, so that load() reports
+    their offending rows. """
+    dtypes = _field_dtypes(klass, df.columns)
+    if dtypes:
+        df = df.copy(deep=False)  # Don't write into a slice of the input
+    for col, dtype in viewitems(dtypes):
+        try:
+            if dtype in ("date", "datetime"):
+                df[col] = pd.to_datetime(df[col], utc=dtype == "datetime")
+            elif dtype in ("Int64", "float64"):
+                df[col] = pd.to_numeric(df[col]).astype(dtype)
+            else:
+                df[col] = df[col].astype(dtype)
+        except (ValueError, TypeError) as e:
+            _logger.warning(
+                "Column %s of %s keeps its values, as it isn't %s: %s",
+                col,
+                klass._name,
+                dtype,
+                e,
             )
-        # Drop lines with empty or NaN index column
-        df = df[df[idx] != ""][  # Filter out empty strings
-            ~df[idx].isnull()  # Filter out none-set values (eg. in json)
-        ]
-        df.set_index(idx, inplace=True)
-        if out and out.read(1):
-            df = df[~df.index.isin(_log_retrieve_loaded_indices(out, mod))]
-        GRAPH.add_node(id(df), model=model, df=df)
+    return df
 
-    # Special case: Excel file with sheets
-    if input_type == "xls":
-        xlf = pd.ExcelFile(buf)
-        for name in xlf.sheet_names:
-            model = _infer_valid_model(name)
-            if not model:
-                continue
-            df = _read_excel(xlf, name)
-            _load_into_graph(df, model)
-        return
 
+def _parse_jobs(buf, input_type, model, chunksize=None, concurrent=False):
+    """ Returns the parse jobs of an input as [(model, (reader, args), lazy)]:
+    one per sheet of a valid model for excel files, else one. With a
+    chunksize (batch size, unless models set their own), supported formats
+    get lazy readers. If concurrent, jobs don't share the input, so that
+    they can be parsed in threads or processes. """
+    if input_type == "xls":
+        return _excel_jobs(buf, chunksize, concurrent)
     if not model:
-        return
+        return []
+    chunksize = _model_batch(model, chunksize) if chunksize else None
+    if input_type not in SUPPORTED_FORMATS_LAZY:
+        chunksize = None
+    if input_type in SUPPORTED_FORMATS_COLUMNAR:
+        if not pa:
+            raise click.UsageError(
+                "Reading {} files needs pyarrow (arrow extra).".format(input_type)
+            )
+        # Memory-mapped from their path, never copied
+        return [
+            (
+                model,
+                (_read_columnar, (buf.name, input_type, model, chunksize)),
+                bool(chunksize),
+            )
+        ]
+    if concurrent and not chunksize:
+        buf = io.BytesIO(buf.read())
     if input_type == "csv":
-        df = _read_csv(buf)
+        return [(model, (_read_csv, (buf, chunksize)), bool(chunksize))]
     if input_type == "json":
-        df = _read_json(buf)
-    _load_into_graph(df, model)
+        return [(model, (_read_json, (buf,)), False)]
+    return [(model, (_read_json, (buf, True, chunksize)), bool(chunksize))]
+
+
+def _excel_jobs(buf, chunksize=None, concurrent=False):
+    """ Returns the parse jobs of the sheets of an excel file, that are named
+    after a valid model. Other sheets never get parsed. With a chunksize,
+    xlsx sheets get streamed in read-only mode, if openpyxl is installed. """
+    if chunksize and openpyxl:
+        content = buf.read()
+        if zipfile.is_zipfile(io.BytesIO(content)):
+            workbook = openpyxl.load_workbook(io.BytesIO(content), read_only=True)
+            names = workbook.sheetnames
+            workbook.close()
+            return [
+                (
+                    _infer_valid_model(name),
+                    (
+                        _read_excel_lazy,
+                        (
+                            content,
+                            name,
+                            _model_batch(_infer_valid_model(name), chunksize),
+                        ),
+                    ),
+                    True,
+                )
+                for name in names
+                if _infer_valid_model(name)
+            ]
+        buf = io.BytesIO(content)  # Not an xlsx file, parse it at once
+    content = buf.read() if concurrent else None
+    xlf = pd.ExcelFile(io.BytesIO(content) if concurrent else buf)
+    return [
+        (
+            _infer_valid_model(name),
+            (_read_excel, (io.BytesIO(content) if concurrent else xlf, name)),
+            False,
+        )
+        for name in xlf.sheet_names
+        if _infer_valid_model(name)
+    ]
+
+
+def _parse(job):
+    """ Pool entry point, for threads or processes. Runs a (reader, args)
+    parse job. Returns (result, None), or (None, error), so that errors get
+    reported by the caller, along with their input. """
+    reader, args = job
+    try:
+        return reader(*args), None
+    except Exception as e:  # Any parser error is a bad input
+        return None, "{}: {}".format(type(e).__name__, e)
+
+
+def _load_dataframes(
+    inputs,
+    loaded,
+    lazy=False,
+    batch=None,
+    typed=False,
+    workers=1,
+    processes=False,
+    cache=None,
+):
+    """ Loads dataframes of inputs [(buf, input_type, model, name)] into the
+    GRAPH global receiver, without the records already loaded as per the
+    {model: {index: hash}} loaded receiver.
+    If lazy, supported formats are read in chunks of batch size, as they
+    get loaded. If typed, columns are converted into dtypes of their odoo
+    fields, once, as they get read.
+
+    With more than one worker, files and excel sheets are parsed
+    concurrently, in threads, or in forked processes if processes is set.
+    Nodes get assembled in input order, once all parsing is done, so the
+    graph is the same as with a single worker. Parse errors are raised as
+    BadParameter of their input.
+
+    With an InputCache, inputs read at once are parsed only if their
+    content wasn't parsed before: index-normalized DataFrames are read
+    from the cache, instead.
+
+    If the graph collects hashes, rows are hashed as they get read, and only
+    dropped, if they were loaded with the same hash. """
+
+    def _prepare(df, mod):
+        hashes = None
+        if GRAPH.hashes is not None:
+            hashes = _row_hashes(df)
+            GRAPH.hashes.setdefault(mod, {}).update(zip(df.index, hashes))
+        df = _drop_loaded(df, loaded.get(mod), hashes)
+        return _typed_dataframe(df, ENV[mod]) if typed else df
+
+    def _load_into_graph(df, mod):
+        df = _prepare(df, mod)
+        GRAPH.add_node(id(df), model=mod, df=df)
+
+    def _load_lazy_into_graph(reader, mod, name):
+        frames = _lazy_frames(reader, mod, name)
+        # The head chunk conveys columns and index for the metadata stages
+        head = next(frames, None)
+        if head is None:
+            # Empty input: fail as it would if read at once
+            _index_dataframe(pd.DataFrame())
+        columns = head.columns
+        chunks = (_prepare(_conform(df, columns, name), mod) for df in frames)
+        head = _prepare(head, mod)
+        GRAPH.add_node(id(head), model=mod, lazy=True, head=head, chunks=chunks)
+
+    jobs, entries = _collect_jobs(inputs, batch if lazy else None, workers, cache)
+
+    # Lazy readers only parse as they get loaded
+    results = _parse_all(
+        [job for _name, _model, job, chunked, df in jobs if job and not chunked],
+        workers,
+        processes,
+    )
+
+    frames = []
+    for name, model, job, chunked, df in jobs:
+        if df is None:
+            df, error = _parse(job) if chunked else next(results)
+            if error:
+                raise click.BadParameter(
+                    "Cannot parse {}: {}".format(model, error),
+                    ctx=click.get_current_context(),
+                    param_hint=name,
+                )
+            if not chunked:
+                df = _index_dataframe(df)
+        frames.append(df)
+    for key, start, stop in entries:
+        cache.put(key, [(jobs[i][1], frames[i]) for i in range(start, stop)])
+
+    for (name, model, _job, chunked, _df), df in zip(jobs, frames):
+        if chunked:
+            _load_lazy_into_graph(df, model, name)
+        else:
+            _load_into_graph(df, model)
+
+
+def _lazy_frames(reader, model, name):
+    """ Yields the index-normalized chunks of a lazy reader. Parse errors are
+    raised as BadParameter of their input, as if read at once. """
+    reader = iter(reader)
+    while True:
+        try:
+            df = next(reader)
+        except StopIteration:
+            return
+        except Exception as e:  # Any parser error is a bad input
+            raise click.BadParameter(
+                "Cannot parse {}: {}: {}".format(model, type(e).__name__, e),
+                ctx=click.get_current_context(silent=True),
+                param_hint=name,
+            )
+        yield _index_dataframe(df)
+
+
+def _conform(df, columns, name):
+    """ Reindexes a later chunk of a lazy input to the columns of its head
+    chunk, which the metadata stages saw. Records of jsonl may list their
+    keys in any order, or leave some out. Raises on unknown columns. """
+    unknown = [col for col in df.columns if col not in columns]
+    if unknown:
+        raise click.UsageError(
+            "{name}: columns {unknown} are not in its first chunk. Read it "
+            "without --lazy, or give its first records all keys.".format(
+                name=name, unknown=", ".join(unknown)
+            )
+        )
+    return df.reindex(columns=columns)
+
+
+def _collect_jobs(inputs, chunksize=None, workers=1, cache=None):
+    """ Returns the parse jobs of inputs as [(name, model, job, lazy,
+    cached DataFrame)], and the jobs to cache once parsed, as
+    [(key, start, stop)]. Jobs of inputs found in the cache are None. """
+    jobs, entries = [], []
+    for buf, input_type, model, name in inputs:
+        key = None
+        if cache and _cacheable(input_type, chunksize):
+            content = buf.read()
+            buf = io.BytesIO(content)
+            key = cache.key(hashlib.sha1(content).hexdigest(), input_type, model)
+            hit = cache.get(key)
+            if hit is not None:
+                jobs.extend((name, mod, None, False, df) for mod, df in hit)
+                continue
+        start = len(jobs)
+        for mod, job, chunked in _parse_jobs(
+            buf, input_type, model, chunksize, workers > 1
+        ):
+            jobs.append((name, mod, job, chunked, None))
+        if key:
+            entries.append((key, start, len(jobs)))
+    return jobs, entries
+
+
+def _parse_all(jobs, workers=1, processes=False):
+    """ Returns an iterator over the (result, error) of parse jobs, in
+    order. With more than one worker, they are all parsed concurrently,
+    in threads, or in forked processes if processes is set. Else, each
+    one is parsed as the iterator gets to it. """
+    if workers < 2 or not jobs:
+        return (_parse(job) for job in jobs)
+    pool = _fork_context().Pool(workers) if processes else ThreadPool(workers)
+    try:
+        return iter(pool.map(_parse, jobs))
+    finally:
+        pool.close()
+        pool.join()
+
+
+def _cacheable(input_type, lazy):
+    """ Returns whether inputs of input_type are read at once and parsed,
+    so that their DataFrames are worth caching """
+    if input_type in SUPPORTED_FORMATS_COLUMNAR:
+        return False
+    return not lazy or input_type not in SUPPORTED_FORMATS_LAZY + ["xls"]
+
+
+def _model_batch(model, batch):
+    """ Returns the batch size of model: its option, else batch """
+    return GRAPH.model_options.get(model, {}).get("batch", batch)
+
+
+def _read_manifest(manifest):
+    """ Reads a YAML (or JSON) manifest of sources and per model options:
+
+        sources:
+          - res.partner.csv  # relative to the manifest
+        models:
+          res.partner:
+            batch: 500
+
+    Returns ([path], {model: options}). """
+    try:
+        spec = yaml.safe_load(manifest)
+    except yaml.YAMLError as e:
+        raise_from(
+            click.BadParameter(
+                "Manifest is neither valid YAML nor JSON:\n{}".format(e),
+                ctx=click.get_current_context(),
+                param_hint="--manifest",
+            ),
+            e,
+        )
+    if not isinstance(spec, dict) or set(spec) - {"sources", "models"}:
+        raise click.BadParameter(
+            "Manifest must be a mapping of 'sources' and 'models'.",
+            ctx=click.get_current_context(),
+            param_hint="--manifest",
+        )
+    sources, specs = spec.get("sources") or [], spec.get("models") or {}
+    if not isinstance(sources, list) or not all(
+        isinstance(path, string_types) for path in sources
+    ):
+        raise click.BadParameter(
+            "Manifest 'sources' must be a list of paths.",
+            ctx=click.get_current_context(),
+            param_hint="--manifest",
+        )
+    if not isinstance(specs, dict):
+        raise click.BadParameter(
+            "Manifest 'models' must be a mapping of models to their options.",
+            ctx=click.get_current_context(),
+            param_hint="--manifest",
+        )
+    base = os.path.dirname(os.path.abspath(manifest.name))
+    paths = [os.path.join(base, path) for path in sources]
+    models = {}
+    for model, options in viewitems(specs):
+        if not _infer_valid_model(model):
+            raise click.BadParameter(
+                "{} is no valid odoo model.".format(model),
+                ctx=click.get_current_context(),
+                param_hint="--manifest",
+            )
+        if not isinstance(options or {}, dict):
+            raise click.BadParameter(
+                "Options of {} must be a mapping.".format(model),
+                ctx=click.get_current_context(),
+                param_hint="--manifest",
+            )
+        options = dict(options or {})
+        for name, value in viewitems(options):
+            kind, minimum = MANIFEST_OPTIONS.get(name, (None, None))
+            if (
+                not kind
+                or not isinstance(value, kind)
+                or (kind is int and (isinstance(value, bool) or value < minimum))
+            ):
+                raise click.BadParameter(
+                    "Invalid option {name}: {value} for {model}. Supported "
+                    "options: {supported}.".format(
+                        name=name,
+                        value=value,
+                        model=model,
+                        supported=", ".join(MANIFEST_OPTIONS),
+                    ),
+                    ctx=click.get_current_context(),
+                    param_hint="--manifest",
+                )
+        models[model] = options
+    return paths, models
+
+
+def _open_sources(paths):
+    """ Opens source files, to be closed along with the click context """
+    files = []
+    for path in paths:
+        if not os.path.isfile(path):
+            raise click.BadParameter(
+                "Source {} doesn't exist.".format(path),
+                ctx=click.get_current_context(),
+                param_hint="--manifest",
+            )
+        f = open(path, "rb")
+        click.get_current_context().call_on_close(f.close)
+        files.append(f)
+    return files
 
 
-def _read_csv(filepath_or_buffer):
+def _read_csv(filepath_or_buffer, chunksize=None):
     """ Reads a CSV file through pandas from a buffer.
-    Returns a DataFrame. """
-    return pd.read_csv(filepath_or_buffer)
+    Returns a DataFrame, or an iterator over DataFrames of chunksize. """
+    return pd.read_csv(filepath_or_buffer, chunksize=chunksize)
 
 
-def _read_json(filepath_or_buffer):
-    """ Reads a JSON file through pandas from a buffer.
-    Returns a DataFrame. """
-    return pd.read_json(filepath_or_buffer)
+def _read_json(filepath_or_buffer, lines=False, chunksize=None):
+    """ Reads a JSON file through pandas from a buffer. Line-delimited
+    JSON (lines) can be read in chunks.
+    Returns a DataFrame, or an iterator over DataFrames of chunksize. """
+    return pd.read_json(filepath_or_buffer, lines=lines, chunksize=chunksize)
 
 
 def _read_excel(excelfile, sheetname):
@@ -363,6 +2106,258 @@ def _read_excel(excelfile, sheetname):
     return pd.read_excel(excelfile, sheetname)
 
 
+def _read_columnar(path, input_type, model, chunksize=None):
+    """ Reads a Parquet, Arrow IPC or Feather file through pyarrow, memory-
+    mapped and projected on the columns of fields of model.
+    Returns a DataFrame, or an iterator over DataFrames of chunksize, cut
+    out of one row group (record batches) after the other. """
+    if input_type == "parquet":
+        parquet = pq.ParquetFile(path, memory_map=True)
+        columns = _known_columns(model, parquet.schema.names)
+        tables = (
+            parquet.read_row_group(i, columns=columns)
+            for i in range(parquet.num_row_groups)
+        )
+        if not parquet.num_row_groups:
+            tables = iter([parquet.read(columns=columns)])
+    else:  # Arrow IPC files, which Feather (v2) files are
+        with pa.memory_map(path) as source:
+            names = pa.ipc.open_file(source).schema.names
+        columns = _known_columns(model, names)
+        tables = iter([feather.read_table(path, columns=columns, memory_map=True)])
+    if not chunksize:
+        return _arrow_frame(pa.concat_tables(list(tables)))
+    return _arrow_chunks(tables, chunksize)
+
+
+def _arrow_chunks(tables, chunksize):
+    """ Yields DataFrames of chunksize out of (at least one) arrow tables.
+    Yields at least one, as the head chunk conveys the columns. """
+    yielded = False
+    for table in tables:
+        for start in range(0, table.num_rows, chunksize):
+            yield _arrow_frame(table.slice(start, chunksize))
+            yielded = True
+    if not yielded:
+        yield _arrow_frame(table.slice(0, 0))
+
+
+def _arrow_frame(table):
+    """ Converts an arrow table into a DataFrame. Integers with nulls stay
+    integers, instead of turning into floats. """
+    return table.to_pandas(integer_object_nulls=True)
+
+
+def _known_columns(model, names):
+    """ Returns the column names, that are index columns or name fields of
+    model. Others never get read. """
+    fields = ENV[model]._fields
+    known = [
+        name
+        for name in names
+        if name in ("id", ".id")
+        or odoo.models.fix_import_export_id_paths(name)[0] in fields
+    ]
+    if len(known) < len(names):
+        _logger.warning(
+            "Skipping columns unknown to %s: %s",
+            model,
+            ", ".join(name for name in names if name not in known),
+        )
+    return known
+
+
+def _read_excel_lazy(content, sheetname, chunksize):
+    """ Streams a sheet of XLSX content row by row through openpyxl, in
+    read-only mode. Returns an iterator over DataFrames of chunksize, with
+    at least one, even if empty, so memory scales with chunksize, not with
+    the workbook. """
+    workbook = openpyxl.load_workbook(
+        io.BytesIO(content), read_only=True, data_only=True
+    )
+    try:
+        rows = workbook[sheetname].iter_rows(values_only=True)
+        header = next(rows, ())
+        # Skip columns without header, as pandas would name them Unnamed
+        keep = [i for i, name in enumerate(header) if name is not None]
+        columns = ["{}".format(header[i]) for i in keep]
+        buf, yielded = [], False
+        for row in rows:
+            if all(cell is None for cell in row):
+                continue
+            buf.append([row[i] if i < len(row) else None for i in keep])
+            if len(buf) >= chunksize:
+                yield pd.DataFrame(buf, columns=columns)
+                buf, yielded = [], True
+        if buf or not yielded:
+            yield pd.DataFrame(buf, columns=columns)
+    finally:
+        workbook.close()
+
+
+def load_pipeline(
+    env,
+    file,
+    stream,
+    manifest,
+    chatter,
+    onchange,
+    resolve_ids,
+    raw,
+    typed,
+    batch,
+    batch_target,
+    lazy,
+    workers,
+    processes,
+    read_workers,
+    bisect,
+    reject,
+    commit_every,
+    metadata_cache,
+    cache_dir,
+    cache_size,
+    metrics,
+    incremental,
+    out,
+    metadata=None,
+):
+    """ Runs the whole loading pipeline with the (parsed) options of the
+    load command. Needs an active click context, which closes the inputs.
+    Pass a MetadataCache as metadata to reuse it across runs.
+    Public method. Interface method. """
+    if not chatter:
+        env = env.with_context(tracking_disable=True)
+
+    global ENV  # pylint: disable=W0601
+    global GRAPH  # pylint: disable=W0601
+    ENV = env
+
+    # Non-private Class API, therfore pass env as arg
+    GRAPH = DataSetGraph(env=env)
+    if metadata_cache and not metadata:
+        metadata = MetadataCache(metadata_cache, env)
+    GRAPH.metadata = metadata
+    GRAPH.hashes = {} if incremental else None
+
+    if manifest:
+        paths, GRAPH.model_options = _read_manifest(manifest)
+        file = list(file) + _open_sources(paths)
+
+    # Check either file or stream input is set.
+    if not file and not stream:
+        raise click.BadParameter(
+            "No stream or file input defined. "
+            "Define either a --file and/or a --stream input, or a --manifest.",
+            ctx=click.get_current_context(),
+        )
+
+    # Read the log only once, deduplicate against it in memory
+    loaded = _log_retrieve_loaded_indices(out) if out else {}
+
+    # Stage metrics, written once their stage is done
+    stages = [] if metrics else None
+
+    inputs = []  # Parsed all at once
+    for f in file:
+        if not hasattr(f, "name"):
+            raise click.BadParameter(
+                "{} doesn't seem to be a file.".format(f),
+                ctx=click.get_current_context(),
+            )
+        name = os.path.basename(f.name).lower()
+        name = os.path.splitext(name)[0]
+        type_ = os.path.splitext(f.name)[-1].lower().lstrip(".")
+        if type_ not in SUPPORTED_FORMATS + SUPPORTED_FORMATS_EXCEL:
+            formats = ", ".join(SUPPORTED_FORMATS + SUPPORTED_FORMATS_EXCEL)
+            raise click.BadParameter(
+                "Supported formats: {formats}.\n"
+                "Found {type_}".format(formats=formats, type_=type_),
+                ctx=click.get_current_context(),
+                param_hint=f.name,
+            )
+        if type_ == "xlsx":
+            type_ = "xls"
+
+        excel = type_ == "xls"
+        model = _infer_valid_model(name)
+
+        if not excel and not model:
+            raise click.BadParameter(
+                "Filename is no valid odoo model. For non-excel files, "
+                "the filename (before the extension) must encode the model.",
+                ctx=click.get_current_context(),
+                param_hint=name,
+            )
+        inputs.append((f, type_, model, f.name))
+
+    for (s, type_, model) in stream:
+        type_, model = type_.lower(), _infer_valid_model(model.lower())
+        if hasattr(s, "name"):
+            raise click.BadParameter(
+                "{s} doesn't seem to be a stream.".format(locals()),
+                ctx=click.get_current_context(),
+            )
+        if type_ not in SUPPORTED_FORMATS:
+            formats = ", ".join(SUPPORTED_FORMATS)
+            raise click.BadParameter(
+                "Supported formats for type argument: {formats}.\n"
+                "Found {type_}".format(formats=formats, type_=type_),
+                ctx=click.get_current_context(),
+            )
+
+        if not model:
+            raise click.BadParameter(
+                "Model argument is no valid odoo model.",
+                ctx=click.get_current_context(),
+                param_hint=model,
+            )
+        # Lazy nodes keep reading from the stream until flushed
+        stream = open(s, "rb")
+        click.get_current_context().call_on_close(stream.close)
+        inputs.append((stream, type_, model, s))
+
+    with _measure(stages, "read", env):
+        _load_dataframes(
+            inputs,
+            loaded,
+            lazy,
+            batch,
+            typed,
+            read_workers,
+            processes,
+            InputCache(cache_dir, cache_size * 2 ** 20) if cache_dir else None,
+        )
+
+    with _measure(stages, "load_metadata", env):
+        GRAPH.load_metadata()
+    if resolve_ids:
+        with _measure(stages, "resolve_ids", env):
+            GRAPH.resolve_ids()
+    with _measure(stages, "seed_edges", env):
+        GRAPH.seed_edges()
+    with _measure(stages, "order_to_parent", env):
+        GRAPH.order_to_parent()
+    with _measure(stages, "chunk_dataframes", env):
+        GRAPH.chunk_dataframes(
+            batch, serialize=not onchange, target=batch_target, typed=raw
+        )
+    _write_metrics(metrics, stages)
+    with _measure(stages, "flush_all", env):
+        GRAPH.flush_all(
+            onchange,
+            out,
+            workers,
+            processes,
+            bisect,
+            reject,
+            commit_every,
+            metrics,
+            raw=raw,
+        )
+    _write_metrics(metrics, stages)
+
+
 @click.command(cls=dodoo.CommandWithOdooEnv)
 @dodoo.options.addons_path_opt(True)
 @dodoo.options.db_opt(True)
@@ -383,11 +2378,19 @@ def _read_excel(excelfile, sheetname):
     multiple=True,
     required=False,
     help="[stream type model] Stream, you want to load. "
-    "`type` can be csv or json. "
+    "`type` can be csv, json, jsonl (line-delimited json), parquet, arrow "
+    "or feather. "
     "`model` can be any odoo model availabe in env. "
     "You can specify this option multiple times "
     "for more than one stream to load.",
 )
+@click.option(
+    "--manifest",
+    type=click.File("r"),
+    help="YAML or JSON manifest, listing source files (relative to it) and "
+    "options per model, which override the ones of the run: batch, onchange, "
+    "chatter, workers and commit_every. All sources load in a single run.",
+)
 @click.option(
     "--chatter/--no-chatter",
     default=False,
@@ -407,19 +2410,152 @@ def _read_excel(excelfile, sheetname):
     "certain point in the overall loading sequence. Slows down the loading. "
     "Consider switching it off and load fully validated raw data, instead.",
 )
+@click.option(
+    "--resolve-ids/--no-resolve-ids",
+    default=False,
+    show_default=True,
+    help="Resolve external ids of relational columns before loading, with a "
+    "single query per related model, instead of row by row. Fails before "
+    "loading on missing references. Skips parent columns and related models "
+    "that load within the same run.",
+)
+@click.option(
+    "--raw/--no-raw",
+    default=False,
+    show_default=True,
+    help="Create records with batched create() calls and register their "
+    "external ids, instead of going through load() and its per field "
+    "conversions. Needs typed input, an id column of new external ids, and "
+    "/.id or /id relational columns. Updates of existing records fail.",
+)
+@click.option(
+    "--typed/--no-typed",
+    default=False,
+    show_default=True,
+    help="Convert columns into dtypes of their odoo fields, once, as they get "
+    "read: categories for selections and many2one external ids, nullable "
+    "integers, and dates. Saves memory on wide tables and keeps integers "
+    "from turning into floats on missing values.",
+)
 @click.option(
     "--batch",
     default=50,
     show_default=True,
     help="The batch size. Records are cut-off for iteration after so many records.",
 )
+@click.option(
+    "--batch-target",
+    default=0,
+    show_default=True,
+    type=click.FloatRange(min=0),
+    help="Adapt batch sizes per model, so that batches take about so many "
+    "seconds. --batch is the probe size models start with. Failing batches "
+    "shrink. Hierarchy tables keep --batch. 0 disables it.",
+)
+@click.option(
+    "--lazy/--no-lazy",
+    default=False,
+    show_default=True,
+    help="Read csv and jsonl (line-delimited json) input in chunks of --batch "
+    "size as they get loaded, instead of reading whole files into memory. "
+    "Streams xlsx sheets row by row, with openpyxl installed (xlsx extra), "
+    "and cuts parquet, arrow and feather files row group by row group. "
+    "Hierarchy tables still need to be read at once.",
+)
+@click.option(
+    "--workers",
+    default=1,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help="Load batches of independent models concurrently with so many "
+    "workers, each on its own database cursor. Dependent models still load "
+    "in order. Workers commit their batches as they finish, so a failing "
+    "run can leave part of the data committed.",
+)
+@click.option(
+    "--processes/--threads",
+    default=False,
+    show_default=True,
+    help="Run --workers as forked processes instead of threads. Processes "
+    "scale compute-heavy models (eg. with many computed fields) beyond a "
+    "single core. Each process gets its own database connections.",
+)
+@click.option(
+    "--read-workers",
+    default=1,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help="Parse input files and excel sheets concurrently with so many "
+    "workers, threads or forked processes as per --processes/--threads. "
+    "Models get assembled in input order, once all inputs are parsed.",
+)
+@click.option(
+    "--bisect/--no-bisect",
+    default=False,
+    show_default=True,
+    help="Split failing batches recursively and retry their halves, until the "
+    "offending rows are isolated. All valid rows load in a single run, which "
+    "makes large batch sizes safe to use.",
+)
+@click.option(
+    "--reject",
+    type=click.File("ab", lazy=True),
+    help="Log rows of failed batches into a json lines file. Combine with "
+    "--bisect to only log the offending rows.",
+)
+@click.option(
+    "--commit-every",
+    default=0,
+    show_default=True,
+    type=click.IntRange(min=0),
+    help="Commit every so many batches and checkpoint the --out log "
+    "accordingly. Bounds transaction size and lock duration. Interrupted runs "
+    "resume after the last committed batch. 0 commits once, at the end.",
+)
+@click.option(
+    "--metadata-cache",
+    type=click.Path(file_okay=False, writable=True),
+    help="Cache model metadata into this directory. Cached metadata is "
+    "reused until modules get installed or upgraded, or custom fields "
+    "change, which speeds up the start of frequent small loads.",
+)
+@click.option(
+    "--cache-dir",
+    type=click.Path(file_okay=False, writable=True),
+    help="Cache parsed input into this directory, keyed by its content. Reruns "
+    "on unchanged files read it memory-mapped, instead of parsing them "
+    "again. Doesn't cache --lazy input. Needs pyarrow (arrow extra).",
+)
+@click.option(
+    "--cache-size",
+    default=1024,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help="Size of --cache-dir in MB. Least recently used inputs get evicted.",
+)
+@click.option(
+    "--metrics",
+    type=click.File("ab", lazy=True),
+    help="Log wall time, rows, rows/sec, SQL queries and peak RSS into a json "
+    "lines file: per stage, per batch (including its onchange and load parts) "
+    "and per model.",
+)
+@click.option(
+    "--incremental/--no-incremental",
+    default=False,
+    show_default=True,
+    help="Log a content hash of each loaded record into --out. Next runs "
+    "skip records only if their hash is unchanged, so changed records load "
+    "again. Records logged without hash load once more.",
+)
 @click.option(
     "--out",
-    type=click.File("w+b", lazy=True),
+    type=click.File("a+b", lazy=True),
     show_default=True,
-    help="Log success into a json file.",
+    help="Log success into a json lines file. Records logged as loaded are "
+    "skipped on next runs.",
 )
-def load(env, file, stream, chatter, onchange, batch, out):
+def load(env, **params):
     """ Loads data into an Odoo Database.
 
     Supply data by file or stream in a supported format and load it into a
@@ -431,9 +2567,10 @@ def load(env, file, stream, chatter, onchange, batch, out):
     dependencies in tree-like tables (hierarchies). Cares to load everything
     in the correct order*.
 
-    • Supported formats: JSON, CSV, XLS & XLSX
+    • Supported formats: JSON, JSONL, CSV, XLS, XLSX, Parquet, Arrow & Feather
 
-    • Logs success to --out. Next runs deduplicate based on those logs.
+    • Logs success to --out (json lines). Next runs deduplicate based on
+    those logs.
 
     Note: record-level dependency detection only works with parent columns
     ending in /.id (db ID) or /id (ext ID). Either one must match the principal
@@ -443,92 +2580,7 @@ def load(env, file, stream, chatter, onchange, batch, out):
     supported as they usually are undeterministic (lack of identifier on the
     nested levels). That's too dangerous for ETL.
     """
-    if chatter:
-        env = env.with_context(tracking_disable=chatter)
-
-    global ENV  # pylint: disable=W0601
-    global GRAPH  # pylint: disable=W0601
-    ENV = env
-
-    # Non-private Class API, therfore pass env as arg
-    GRAPH = DataSetGraph(env=env)
-
-    # Check either file or stream input is set.
-    if not file and not stream:
-        raise click.BadParameter(
-            "No stream or file input defined. "
-            "Define either a --file and/or a --stream input.",
-            ctx=click.get_current_context(),
-        )
-
-    for f in file:
-        if not hasattr(f, "name"):
-            raise click.BadParameter(
-                "{} doesn't seem to be a file.".format(f),
-                ctx=click.get_current_context(),
-            )
-        name = os.path.basename(f.name).lower()
-        name = os.path.splitext(name)[0]
-        type_ = os.path.splitext(f.name)[-1].lower().lstrip(".")
-        if type_ not in SUPPORTED_FORMATS + SUPPORTED_FORMATS_EXCEL:
-            formats = ", ".join(SUPPORTED_FORMATS + SUPPORTED_FORMATS_EXCEL)
-            raise click.BadParameter(
-                "Supported formats: {formats}.\n"
-                "Found {type_}".format(formats=formats, type_=type_),
-                ctx=click.get_current_context(),
-                param_hint=f.name,
-            )
-        if type_ == "xlsx":
-            type_ = "xls"
-
-        excel = type_ == "xls"
-        model = _infer_valid_model(name)
-
-        if not excel and not model:
-            raise click.BadParameter(
-                "Filename is no valid odoo model. For non-excel files, "
-                "the filename (before the extension) must encode the model.",
-                ctx=click.get_current_context(),
-                param_hint=name,
-            )
-        _load_dataframes(f, type_, model, out)
-
-    for (s, type_, model) in stream:
-        type_, model = type_.lower(), _infer_valid_model(model.lower())
-        if hasattr(s, "name"):
-            raise click.BadParameter(
-                "{s} doesn't seem to be a stream.".format(locals()),
-                ctx=click.get_current_context(),
-            )
-        if type_ not in SUPPORTED_FORMATS:
-            formats = ", ".join(SUPPORTED_FORMATS)
-            raise click.BadParameter(
-                "Supported formats for type argument: {formats}.\n"
-                "Found {type_}".format(formats=formats, type_=type_),
-                ctx=click.get_current_context(),
-            )
-
-        if not model:
-            raise click.BadParameter(
-                "Model argument is no valid odoo model.",
-                ctx=click.get_current_context(),
-                param_hint=model,
-            )
-        with open(s, "rb") as stream:
-            _load_dataframes(stream, type_, model, out)
-
-    GRAPH.load_metadata()
-    GRAPH.seed_edges()
-    GRAPH.order_to_parent()
-    GRAPH.chunk_dataframes(batch)
-
-    out.seek(0)
-    if not out.read(1):
-        out.write(bytes("[", "utf-8"))  # Hack to produce valid json
-    else:
-        out.seek(-3, 2)
-    GRAPH.flush_all(onchange, out)  # Sychronous loading
-    out.write(bytes("{}]", "utf-8"))  # Hack to produce valid json
+    load_pipeline(env, **params)
 
 
 if __name__ == "__main__":  # pragma: no cover
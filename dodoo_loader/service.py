@@ -0,0 +1,189 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#
+# This file is part of the dodoo-loader (R) project.
+# Copyright (c) 2018 XOE Corp. SAS
+# Authors: David Arnold, et al.
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library; if not, see <http://www.gnu.org/licenses/>.
+#
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import json
+import logging
+import os
+import time
+import traceback
+from builtins import bytes, open
+
+import click
+import dodoo
+from future import standard_library
+
+from . import cli
+
+standard_library.install_aliases()
+
+
+_logger = logging.getLogger(__name__)
+
+
+JOB_SUFFIX = ".json"
+# Options of the load command a job can set: the arguments of load_pipeline
+JOB_OPTIONS = [
+    "file",
+    "stream",
+    "manifest",
+    "chatter",
+    "onchange",
+    "resolve_ids",
+    "raw",
+    "typed",
+    "batch",
+    "batch_target",
+    "lazy",
+    "workers",
+    "processes",
+    "read_workers",
+    "bisect",
+    "reject",
+    "commit_every",
+    "metadata_cache",
+    "cache_dir",
+    "cache_size",
+    "metrics",
+    "incremental",
+    "out",
+]
+
+
+def _job_command():
+    """ Returns a command parsing the load command's own options, without
+    the ones of the odoo environment, which the service provides. """
+    return click.Command(
+        "load", params=[param for param in cli.load.params if param.name in JOB_OPTIONS]
+    )
+
+
+def _claim_jobs(spool):
+    """ Yields pending jobs of spool in name order. Claims them by renaming,
+    so that concurrent services never run the same job. """
+    for name in sorted(os.listdir(spool)):
+        if not name.endswith(JOB_SUFFIX):
+            continue
+        path = os.path.join(spool, name)
+        try:
+            os.rename(path, path + ".running")
+        except OSError:  # Claimed by someone else
+            continue
+        yield path[: -len(JOB_SUFFIX)]
+
+
+def run_job(env, job, metadata=None):
+    """ Runs the job file (without suffix) on env. Jobs hold a json list of
+    load command arguments. Results are logged into the job's .log file, as
+    load logs them into --out, unless the job sets its own --out.
+    Marks the job as .done or .failed, writing failures into its .err file.
+    Returns whether the job succeeded.
+    Public method. """
+    running = job + JOB_SUFFIX + ".running"
+    try:
+        with open(running, "rb") as f:
+            args = json.loads(f.read().decode("utf-8"))
+        if "--out" not in args:
+            args = args + ["--out", job + ".log"]
+        with _job_command().make_context("load", args) as ctx:
+            cli.load_pipeline(env, metadata=metadata, **ctx.params)
+        env.cr.commit()
+    except Exception as e:
+        env.cr.rollback()
+        _logger.error("Job %s failed: %s", os.path.basename(job), e)
+        if isinstance(e, click.ClickException):
+            error = e.format_message() + "\n"
+        else:
+            error = traceback.format_exc()
+        with open(job + ".err", "wb") as f:
+            f.write(bytes(error, "utf-8"))
+        os.rename(running, job + JOB_SUFFIX + ".failed")
+        return False
+    finally:
+        # Don't carry stale records over to the next job
+        env.invalidate_all()
+    os.rename(running, job + JOB_SUFFIX + ".done")
+    _logger.info("Job %s done.", os.path.basename(job))
+    return True
+
+
+@click.command(cls=dodoo.CommandWithOdooEnv)
+@dodoo.options.addons_path_opt(True)
+@dodoo.options.db_opt(True)
+@click.option(
+    "--spool",
+    type=click.Path(exists=True, file_okay=False, writable=True),
+    required=True,
+    help="Directory to pick up jobs from: json files, holding a list of load "
+    'command arguments, eg. ["--file", "/data/res.partner.csv"].',
+)
+@click.option(
+    "--interval",
+    default=2.0,
+    show_default=True,
+    type=click.FloatRange(min=0.1),
+    help="Seconds to wait between polls of the spool directory.",
+)
+@click.option(
+    "--once",
+    is_flag=True,
+    help="Run the pending jobs, then exit, instead of serving continuously.",
+)
+@click.option(
+    "--metadata-cache",
+    type=click.Path(file_okay=False, writable=True),
+    help="Also persist model metadata into this directory.",
+)
+def serve(env, spool, interval, once, metadata_cache):
+    """ Serves load jobs from a spool directory.
+
+    The Odoo environment and model metadata stay warm across jobs, which
+    spares frequent small loads the startup of a full run.
+
+    Drop a job into the spool directory as NAME.json, holding a json list of
+    load command arguments. It gets renamed to NAME.json.running while it
+    runs, then to NAME.json.done or NAME.json.failed. Results are logged
+    into NAME.log, in the format of --out, unless the job sets its own --out.
+    Failures are written into NAME.err.
+
+    The service exits, when modules get installed or upgraded: restart it,
+    to load the new registry.
+    """
+    metadata = cli.MetadataCache(metadata_cache, env)
+    while True:
+        if metadata.refresh(env):
+            raise click.ClickException(
+                "Installed modules changed. Restart the service."
+            )
+        # End the transaction of the check: idle polls would otherwise keep
+        # reading its snapshot, and never see modules change
+        env.cr.rollback()
+        for job in _claim_jobs(spool):
+            run_job(env, job, metadata)
+        if once:
+            return
+        time.sleep(interval)
+
+
+if __name__ == "__main__":  # pragma: no cover
+    serve()
@@ -28,6 +28,7 @@ setup(
         "xlrd",
         "future",
     ],
+    extras_require={"xlsx": ["openpyxl>=2.6"], "arrow": ["pyarrow"]},
     license="LGPLv3+",
     author="XOE Labs",
     author_email="info@xoe.solutions",
@@ -46,5 +47,6 @@ setup(
     entry_points="""
         [core_package.cli_plugins]
         load=dodoo_loader.cli:load
+        load-service=dodoo_loader.service:serve
     """,
 )
@@ -20,12 +20,14 @@
 # along with this library; if not, see <http://www.gnu.org/licenses/>.
 #
 
+import json
 import os
 
 import pytest
 from click.testing import CliRunner
 from dodoo import OdooEnvironment, odoo
 
+from dodoo_loader import cli
 from dodoo_loader.cli import load
 
 # import mock
@@ -252,6 +254,109 @@ def test_onchange_applies(odoodb, jsonlog, odoocfg, mocker):
         assert company.country_id.name == "Test Country"
 
 
+def test_onchange_keeps_row_values(odoodb, jsonlog, odoocfg, mocker):
+    """ Test rows sharing trigger values keep their own other values """
+    if odoo.release.version_info[0] < 10:
+        pytest.skip(
+            "version < 10 does not have the onchange function on "
+            "which this test depends."
+        )
+    result = CliRunner().invoke(
+        load,
+        [
+            "-d",
+            odoodb,
+            "-c",
+            str(odoocfg),
+            "--file",
+            DATADIR + "onchange_groups/res.partner.csv",
+            "--onchange",
+            "--out",
+            str(jsonlog),
+        ],
+    )
+    assert result.exit_code == 0
+    self = mocker.patch("dodoo.CommandWithOdooEnv")
+    self.database = odoodb
+    with OdooEnvironment(self) as env:
+        one = env.ref("__import__.res_partner_onchange_1")
+        two = env.ref("__import__.res_partner_onchange_2")
+        assert (one.name, one.city) == ("Onchange One", "Paris")
+        assert (two.name, two.city) == ("Onchange Two", "Lyon")
+        assert one.country_id == two.country_id == env.ref("base.fr")
+
+
+def test_onchange_xmlid_cache(odoodb, jsonlog, odoocfg, mocker):
+    """ Test external ids of onchange batches resolve in bulk, not by ref """
+    if odoo.release.version_info[0] < 10:
+        pytest.skip(
+            "version < 10 does not have the onchange function on "
+            "which this test depends."
+        )
+    ref = mocker.spy(odoo.api.Environment, "ref")
+    result = CliRunner().invoke(
+        load,
+        [
+            "-d",
+            odoodb,
+            "-c",
+            str(odoocfg),
+            "--file",
+            DATADIR + "workers/res.country.state.json",
+            "--file",
+            DATADIR + "workers/res.country.json",
+            "--onchange",
+            "--batch",
+            "1",
+            "--out",
+            str(jsonlog),
+        ],
+    )
+    assert result.exit_code == 0
+    assert not [c for c in ref.call_args_list if "workers" in str(c)]
+    self = mocker.patch("dodoo.CommandWithOdooEnv")
+    self.database = odoodb
+    with OdooEnvironment(self) as env:
+        state = env.ref("__import__.res_country_state_workers_2")
+        assert state.country_id == env.ref("__import__.res_country_workers_2")
+
+
+def test_onchange_dedup(odoodb, jsonlog, odoocfg, mocker):
+    """ Test identical rows share a single onchange call """
+    if odoo.release.version_info[0] < 10:
+        pytest.skip(
+            "version < 10 does not have the onchange function on "
+            "which this test depends."
+        )
+    onchange = mocker.spy(odoo.models.BaseModel, "onchange")
+    result = CliRunner().invoke(
+        load,
+        [
+            "-d",
+            odoodb,
+            "-c",
+            str(odoocfg),
+            "--file",
+            DATADIR + "onchange_dedup/res.partner.csv",
+            "--onchange",
+            "--out",
+            str(jsonlog),
+        ],
+    )
+    assert result.exit_code == 0
+    assert onchange.call_count == 2
+    self = mocker.patch("dodoo.CommandWithOdooEnv")
+    self.database = odoodb
+    with OdooEnvironment(self) as env:
+        for xmlid, name, city in [
+            ("__import__.res_partner_dedup_1", "Dedup Twin", "Paris"),
+            ("__import__.res_partner_dedup_2", "Dedup Twin", "Paris"),
+            ("__import__.res_partner_dedup_3", "Dedup Other", "Lyon"),
+        ]:
+            partner = env.ref(xmlid)
+            assert (partner.name, partner.city) == (name, city)
+
+
 def test_subfield_fails_gracefully(odoodb, jsonlog, odoocfg):
     """ Test unsupported subfield and nested notation give correct errors """
 
@@ -289,6 +394,13 @@ def test_log_deduplication_1(odoodb, jsonlog, odoocfg):
         ],
     )
     assert result.exit_code == 0
+    with open(str(jsonlog), "r") as logs:
+        lines = logs.readlines()
+    assert json.loads(lines[-1])["candidates"] == [
+        "__import__.res_country_test_1",
+        "__import__.res_country_test_2",
+        "__import__.res_country_test_3",
+    ]
 
     result = CliRunner().invoke(
         load,
@@ -306,37 +418,1022 @@ def test_log_deduplication_1(odoodb, jsonlog, odoocfg):
     )
     assert result.exit_code == 0
     with open(str(jsonlog), "r") as logs:
-        assert not logs.read().endswith(
-            """
-},{
-    "batch": 0,
-    "candidates": [
-        "__import__.res_country_test_1",
-        "__import__.res_country_test_2",
-        "__import__.res_country_test_3"
-    ],
-    "loaded": [
-        252,
-        253,
-        254
-    ],
-    "model": "res.country",
-    "state": "success",
-    "x_msgs": []
-},{
-    "batch": 0,
-    "candidates": [
-        "__import__.res_country_test_1",
-        "__import__.res_country_test_2",
-        "__import__.res_country_test_3"
-    ],
-    "loaded": [
-        252,
-        253,
-        254
-    ],
-    "model": "res.country",
-    "state": "success",
-    "x_msgs": []
-},{}]"""
-        )  # Esure second load did not do (and log) anything
+        # Esure second load did not do (and log) anything
+        assert logs.readlines() == lines
+
+
+def test_parallel_flush(odoodb, jsonlog, odoocfg, mocker):
+    """ Test independent batches load concurrently, dependent ones in order """
+
+    result = CliRunner().invoke(
+        load,
+        [
+            "-d",
+            odoodb,
+            "-c",
+            str(odoocfg),
+            "--file",
+            DATADIR + "workers/res.country.state.json",  # Should load second
+            "--file",
+            DATADIR + "workers/res.country.json",  # Should load first
+            "--no-onchange",
+            "--batch",
+            "1",
+            "--workers",
+            "2",
+            "--out",
+            str(jsonlog),
+        ],
+    )
+    assert result.exit_code == 0
+    self = mocker.patch("dodoo.CommandWithOdooEnv")
+    self.database = odoodb
+    with OdooEnvironment(self) as env:
+        state = env.ref("__import__.res_country_state_workers_2")
+        assert state.country_id == env.ref("__import__.res_country_workers_2")
+
+
+def test_serialize_once(odoodb, jsonlog, odoocfg, mocker):
+    """ Test chunks are serialized once per node, then sliced into batches """
+
+    from_frame = mocker.spy(cli.Payload, "from_frame")
+    odoo_load = mocker.patch("dodoo_loader.cli.odoo_load", wraps=cli.odoo_load)
+    result = CliRunner().invoke(
+        load,
+        [
+            "-d",
+            odoodb,
+            "-c",
+            str(odoocfg),
+            "--file",
+            DATADIR + "workers/res.country.json",
+            "--no-onchange",
+            "--batch",
+            "1",
+            "--out",
+            str(jsonlog),
+        ],
+    )
+    assert result.exit_code == 0
+    assert from_frame.call_count == 1
+    chunks = [c[0][2] for c in odoo_load.call_args_list]
+    assert all(isinstance(chunk, cli.Payload) for chunk in chunks)
+    assert [(chunk.fields, chunk.rows) for chunk in chunks] == [
+        (
+            ["id", "name"],
+            [["__import__.res_country_workers_1", "Test Country (workers) 1"]],
+        ),
+        (
+            ["id", "name"],
+            [["__import__.res_country_workers_2", "Test Country (workers) 2"]],
+        ),
+    ]
+
+
+def test_parallel_flush_processes(odoodb, jsonlog, odoocfg, mocker):
+    """ Test batches load through forked worker processes """
+
+    result = CliRunner().invoke(
+        load,
+        [
+            "-d",
+            odoodb,
+            "-c",
+            str(odoocfg),
+            "--file",
+            DATADIR + "processes/res.country.json",
+            "--no-onchange",
+            "--batch",
+            "1",
+            "--workers",
+            "2",
+            "--processes",
+            "--out",
+            str(jsonlog),
+        ],
+    )
+    assert result.exit_code == 0
+    self = mocker.patch("dodoo.CommandWithOdooEnv")
+    self.database = odoodb
+    with OdooEnvironment(self) as env:
+        assert env.ref("__import__.res_country_processes_1")
+        assert env.ref("__import__.res_country_processes_3")
+
+
+def test_lazy_read(odoodb, jsonlog, odoocfg, mocker):
+    """ Test line-delimited json is read in chunks as it gets loaded """
+
+    result = CliRunner().invoke(
+        load,
+        [
+            "-d",
+            odoodb,
+            "-c",
+            str(odoocfg),
+            "--file",
+            DATADIR + "lazy/res.country.jsonl",
+            "--no-onchange",
+            "--batch",
+            "2",
+            "--lazy",
+            "--out",
+            str(jsonlog),
+        ],
+    )
+    assert result.exit_code == 0
+    self = mocker.patch("dodoo.CommandWithOdooEnv")
+    self.database = odoodb
+    with OdooEnvironment(self) as env:
+        assert env.ref("__import__.res_country_lazy_1")
+        assert env.ref("__import__.res_country_lazy_3")
+
+
+def test_lazy_read_empty(odoodb, jsonlog, odoocfg, tmpdir):
+    """ Test empty input fails alike, read lazily or at once """
+
+    tmpdir.join("res.country.jsonl").write("")
+    outputs = []
+    for lazy in ("--no-lazy", "--lazy"):
+        result = CliRunner().invoke(
+            load,
+            [
+                "-d",
+                odoodb,
+                "-c",
+                str(odoocfg),
+                "--file",
+                str(tmpdir.join("res.country.jsonl")),
+                "--no-onchange",
+                lazy,
+                "--out",
+                str(jsonlog),
+            ],
+        )
+        assert result.exit_code == 2
+        outputs.append(result.output)
+    assert "You need to provide an index column" in outputs[1]
+    assert outputs[0] == outputs[1]
+
+
+def test_lazy_read_chunks(odoodb, jsonlog, odoocfg, mocker, tmpdir):
+    """ Test later chunks are conformed to the columns of the first one, and
+    bad input is reported along with its name """
+
+    def run(content):
+        tmpdir.join("res.country.jsonl").write(content)
+        return CliRunner().invoke(
+            load,
+            [
+                "-d",
+                odoodb,
+                "-c",
+                str(odoocfg),
+                "--file",
+                str(tmpdir.join("res.country.jsonl")),
+                "--no-onchange",
+                "--batch",
+                "1",
+                "--lazy",
+                "--out",
+                str(jsonlog),
+            ],
+        )
+
+    result = run(
+        '{"id": "__import__.res_country_chunks_1", "name": "Chunks 1", '
+        '"code": "QN"}\n'
+        '{"code": "QO", "name": "Chunks 2", "id": "__import__.res_country_chunks_2"}\n'
+    )
+    assert result.exit_code == 0
+    self = mocker.patch("dodoo.CommandWithOdooEnv")
+    self.database = odoodb
+    with OdooEnvironment(self) as env:
+        country = env.ref("__import__.res_country_chunks_2")
+        assert (country.name, country.code) == ("Chunks 2", "QO")
+
+    result = run(
+        '{"id": "__import__.res_country_chunks_3", "name": "Chunks 3"}\n'
+        '{"id": "__import__.res_country_chunks_4", "name": "Chunks 4", '
+        '"code": "QP"}\n'
+    )
+    assert result.exit_code != 0
+    assert "columns code are not in its first chunk" in result.output
+
+    result = run('{"id": "__import__.res_country_chunks_5",\n')
+    assert result.exit_code != 0
+    assert "Cannot parse res.country" in result.output
+    assert "res.country.jsonl" in result.output
+
+
+def test_lazy_xlsx(odoodb, jsonlog, odoocfg, mocker):
+    """ Test xlsx sheets are streamed in chunks as they get loaded """
+
+    pytest.importorskip("openpyxl")
+    result = CliRunner().invoke(
+        load,
+        [
+            "-d",
+            odoodb,
+            "-c",
+            str(odoocfg),
+            "--file",
+            DATADIR + "lazy/res.country.xlsx",
+            "--no-onchange",
+            "--batch",
+            "2",
+            "--lazy",
+            "--out",
+            str(jsonlog),
+        ],
+    )
+    assert result.exit_code == 0
+    self = mocker.patch("dodoo.CommandWithOdooEnv")
+    self.database = odoodb
+    with OdooEnvironment(self) as env:
+        assert env.ref("__import__.res_country_lazy_xlsx_1")
+        assert env.ref("__import__.res_country_lazy_xlsx_3")
+
+
+def test_bisect_rejects(odoodb, jsonlog, odoocfg, mocker, tmpdir):
+    """ Test failing batches are bisected and offending rows rejected """
+
+    rejectlog = tmpdir / "rejects.jsonl"
+    result = CliRunner().invoke(
+        load,
+        [
+            "-d",
+            odoodb,
+            "-c",
+            str(odoocfg),
+            "--file",
+            DATADIR + "bisect/res.country.json",  # Second row lacks a name
+            "--no-onchange",
+            "--bisect",
+            "--reject",
+            str(rejectlog),
+            "--out",
+            str(jsonlog),
+        ],
+    )
+    assert result.exit_code == 0
+    rejects = [json.loads(line) for line in rejectlog.readlines()]
+    assert len(rejects) == 1
+    assert rejects[0]["rows"][0][0] == "__import__.res_country_bisect_2"
+    self = mocker.patch("dodoo.CommandWithOdooEnv")
+    self.database = odoodb
+    with OdooEnvironment(self) as env:
+        assert env.ref("__import__.res_country_bisect_1")
+        assert env.ref("__import__.res_country_bisect_3")
+
+
+def test_commit_every_checkpoints(odoodb, jsonlog, odoocfg):
+    """ Test batches are committed and checkpointed into the log """
+
+    result = CliRunner().invoke(
+        load,
+        [
+            "-d",
+            odoodb,
+            "-c",
+            str(odoocfg),
+            "--file",
+            DATADIR + "commit_every/res.country.json",
+            "--no-onchange",
+            "--batch",
+            "1",
+            "--commit-every",
+            "1",
+            "--out",
+            str(jsonlog),
+        ],
+    )
+    assert result.exit_code == 0
+    with open(str(jsonlog), "r") as logs:
+        records = [json.loads(line) for line in logs.readlines()][-4:]
+    assert records[0]["candidates"] == ["__import__.res_country_commit_1"]
+    assert records[1]["state"] == "checkpoint"
+    assert records[2]["candidates"] == ["__import__.res_country_commit_2"]
+    assert records[3]["state"] == "checkpoint"
+
+
+def test_metrics(odoodb, jsonlog, odoocfg, tmpdir):
+    """ Test stage, batch and node metrics are logged """
+    metrics = tmpdir.join("metrics.jsonl")
+
+    result = CliRunner().invoke(
+        load,
+        [
+            "-d",
+            odoodb,
+            "-c",
+            str(odoocfg),
+            "--file",
+            DATADIR + "metrics/res.country.json",
+            "--no-onchange",
+            "--batch",
+            "1",
+            "--metrics",
+            str(metrics),
+            "--out",
+            str(jsonlog),
+        ],
+    )
+    assert result.exit_code == 0
+    with open(str(metrics), "r") as logs:
+        records = [json.loads(line) for line in logs.readlines()]
+    stages = [record["stage"] for record in records]
+    assert stages.count("load") == 2
+    assert stages.count("batch") == 2
+    assert stages[-1] == "flush_all"
+    node = records[stages.index("node")]
+    assert node["model"] == "res.country"
+    assert node["rows"] == 2
+    assert node["queries"] > 0
+
+
+def test_batch_target(odoodb, jsonlog, odoocfg):
+    """ Test adaptive batches grow from the probe size and load all rows """
+
+    result = CliRunner().invoke(
+        load,
+        [
+            "-d",
+            odoodb,
+            "-c",
+            str(odoocfg),
+            "--file",
+            DATADIR + "batch_target/res.country.json",
+            "--no-onchange",
+            "--batch",
+            "1",
+            "--batch-target",
+            "60",
+            "--out",
+            str(jsonlog),
+        ],
+    )
+    assert result.exit_code == 0
+    with open(str(jsonlog), "r") as logs:
+        records = [json.loads(line) for line in logs.readlines()]
+    candidates = [
+        record["candidates"]
+        for record in records
+        if record.get("model") == "res.country"
+        and "target" in "".join(record["candidates"])
+    ]
+    assert candidates == [
+        ["__import__.res_country_target_1"],
+        ["__import__.res_country_target_2", "__import__.res_country_target_3"],
+        ["__import__.res_country_target_4"],
+    ]
+
+
+def test_batch_target_lazy_keys(odoodb, jsonlog, odoocfg, mocker):
+    """ Test adaptive batches of lazy chunks keep values in their fields,
+    when records list their keys in another order """
+
+    result = CliRunner().invoke(
+        load,
+        [
+            "-d",
+            odoodb,
+            "-c",
+            str(odoocfg),
+            "--file",
+            DATADIR + "lazy_keys/res.country.jsonl",
+            "--no-onchange",
+            "--lazy",
+            "--batch",
+            "1",
+            "--batch-target",
+            "60",
+            "--out",
+            str(jsonlog),
+        ],
+    )
+    assert result.exit_code == 0
+    self = mocker.patch("dodoo.CommandWithOdooEnv")
+    self.database = odoodb
+    with OdooEnvironment(self) as env:
+        for i, code in enumerate(["QK", "QL", "QM"], 1):
+            country = env.ref("__import__.res_country_keys_{}".format(i))
+            assert country.name == "Test Country (keys) {}".format(i)
+            assert country.code == code
+
+
+def test_manifest(odoodb, jsonlog, odoocfg):
+    """ Test manifest sources load with their model options """
+
+    result = CliRunner().invoke(
+        load,
+        [
+            "-d",
+            odoodb,
+            "-c",
+            str(odoocfg),
+            "--manifest",
+            DATADIR + "manifest/manifest.yml",
+            "--batch",
+            "50",
+            "--out",
+            str(jsonlog),
+        ],
+    )
+    assert result.exit_code == 0
+    with open(str(jsonlog), "r") as logs:
+        records = [json.loads(line) for line in logs.readlines()]
+    candidates = [
+        record["candidates"]
+        for record in records
+        if "manifest" in "".join(record.get("candidates", []))
+    ]
+    assert candidates == [
+        ["__import__.res_country_manifest_1", "__import__.res_country_manifest_2"],
+        ["__import__.res_country_manifest_3"],
+    ]
+
+
+def test_manifest_invalid(odoodb, jsonlog, odoocfg, tmpdir):
+    """ Test YAML errors and malformed manifests are reported """
+
+    manifest = tmpdir.join("manifest.yml")
+    manifest.write("sources: [res.country.json\n")
+    result = CliRunner().invoke(
+        load,
+        [
+            "-d",
+            odoodb,
+            "-c",
+            str(odoocfg),
+            "--manifest",
+            str(manifest),
+            "--out",
+            str(jsonlog),
+        ],
+    )
+    assert result.exit_code != 0
+    assert "Manifest is neither valid YAML nor JSON" in result.output
+    assert "line 2" in result.output
+
+    # Sources, models and their options of the wrong shape
+    for content, message in [
+        ("sources: res.country.json\n", "must be a list of paths"),
+        ("models:\n  - res.partner\n", "must be a mapping of models"),
+        ("models:\n  res.partner: 500\n", "Options of res.partner"),
+    ]:
+        manifest.write(content)
+        result = CliRunner().invoke(
+            load,
+            [
+                "-d",
+                odoodb,
+                "-c",
+                str(odoocfg),
+                "--manifest",
+                str(manifest),
+                "--out",
+                str(jsonlog),
+            ],
+        )
+        assert result.exit_code != 0
+        assert message in result.output
+
+
+def test_chatter(odoodb, odoocfg, mocker, tmpdir):
+    """ Test --no-chatter disables tracking and --chatter keeps it """
+
+    def tracking_disable(flag):
+        odoo_load = mocker.patch("dodoo_loader.cli.odoo_load", wraps=cli.odoo_load)
+        result = CliRunner().invoke(
+            load,
+            [
+                "-d",
+                odoodb,
+                "-c",
+                str(odoocfg),
+                "--file",
+                DATADIR + "res.country.json",
+                "--no-onchange",
+                flag,
+                "--out",
+                str(tmpdir.join(flag + ".json")),
+            ],
+        )
+        assert result.exit_code == 0
+        return [
+            c[0][0].context.get("tracking_disable") for c in odoo_load.call_args_list
+        ]
+
+    assert tracking_disable("--no-chatter") == [True]
+    assert not any(tracking_disable("--chatter"))
+
+
+def test_hierarchy_cycle_fails(odoodb, jsonlog, odoocfg):
+    """ Test cycles in hierarchy tables are reported before loading """
+
+    result = CliRunner().invoke(
+        load,
+        [
+            "-d",
+            odoodb,
+            "-c",
+            str(odoocfg),
+            "--file",
+            DATADIR + "hierarchy_cycle/res.partner.csv",
+            "--no-onchange",
+            "--out",
+            str(jsonlog),
+        ],
+    )
+    assert result.exit_code != 0
+    assert "must not contain cycles" in result.output
+    assert "res_partner_cycle_1" in result.output
+    assert "res_partner_cycle_3" not in result.output
+
+
+def test_parallel_hierarchy_waves(odoodb, jsonlog, odoocfg, mocker):
+    """ Test levels of a hierarchy table load concurrently, level by level """
+
+    result = CliRunner().invoke(
+        load,
+        [
+            "-d",
+            odoodb,
+            "-c",
+            str(odoocfg),
+            "--file",
+            DATADIR + "waves/res.partner.csv",  # Records are in wrong order
+            "--no-onchange",
+            "--batch",
+            "1",
+            "--workers",
+            "2",
+            "--out",
+            str(jsonlog),
+        ],
+    )
+    assert result.exit_code == 0
+    self = mocker.patch("dodoo.CommandWithOdooEnv")
+    self.database = odoodb
+    with OdooEnvironment(self) as env:
+        holding = env.ref("__import__.res_partner_waves_1")
+        company = env.ref("__import__.res_partner_waves_3")
+        assert company.parent_id == holding
+        assert env.ref("__import__.res_partner_waves_5").parent_id == company
+
+
+def test_metadata_cache(odoodb, jsonlog, odoocfg, mocker, tmpdir):
+    """ Test model metadata is cached on disk and reused """
+    args = [
+        "-d",
+        odoodb,
+        "-c",
+        str(odoocfg),
+        "--file",
+        DATADIR + "res.country.json",
+        "--no-onchange",
+        "--metadata-cache",
+        str(tmpdir),
+        "--out",
+        str(jsonlog),
+    ]
+
+    result = CliRunner().invoke(load, args)
+    assert result.exit_code == 0
+    path = str(tmpdir.join(odoodb, "res.country.json"))
+    with open(path, "r") as f:
+        cached = json.load(f)
+    assert cached["key"]
+    assert {"name": "currency_id", "model": "res.currency"} in cached["spec"][
+        "relational"
+    ]
+
+    # Metadata served from the cache is not written again
+    os.utime(path, (0, 0))
+    result = CliRunner().invoke(load, args)
+    assert result.exit_code == 0
+    assert os.path.getmtime(path) == 0
+
+    # Manual fields invalidate it
+    self = mocker.patch("dodoo.CommandWithOdooEnv")
+    self.database = odoodb
+    with OdooEnvironment(self) as env:
+        env["ir.model.fields"].create(
+            {
+                "model_id": env.ref("base.model_res_country").id,
+                "name": "x_metadata_cache",
+                "field_description": "Metadata Cache",
+                "ttype": "char",
+            }
+        )
+        env.cr.commit()
+    result = CliRunner().invoke(load, args)
+    assert result.exit_code == 0
+    assert os.path.getmtime(path) != 0
+
+
+def test_resolve_ids(odoodb, jsonlog, odoocfg, mocker):
+    """ Test external ids are resolved before loading, missing ones fail """
+
+    result = CliRunner().invoke(
+        load,
+        [
+            "-d",
+            odoodb,
+            "-c",
+            str(odoocfg),
+            "--file",
+            DATADIR + "resolve_ids/res.country.state.csv",
+            "--no-onchange",
+            "--resolve-ids",
+            "--out",
+            str(jsonlog),
+        ],
+    )
+    assert result.exit_code == 0
+    self = mocker.patch("dodoo.CommandWithOdooEnv")
+    self.database = odoodb
+    with OdooEnvironment(self) as env:
+        state = env.ref("__import__.res_country_state_resolve_2")
+        assert state.country_id == env.ref("base.fr")
+
+    result = CliRunner().invoke(
+        load,
+        [
+            "-d",
+            odoodb,
+            "-c",
+            str(odoocfg),
+            "--file",
+            DATADIR + "resolve_ids_missing/res.country.state.csv",
+            "--no-onchange",
+            "--resolve-ids",
+            "--out",
+            str(jsonlog),
+        ],
+    )
+    assert result.exit_code != 0
+    assert "base.no_such_country" in result.output
+    with OdooEnvironment(self) as env:
+        assert not env.ref("__import__.res_country_state_resolve_3", False)
+
+
+def test_resolve_ids_many(odoodb, jsonlog, odoocfg, mocker):
+    """ Test comma-separated external ids of x2many columns are resolved """
+
+    result = CliRunner().invoke(
+        load,
+        [
+            "-d",
+            odoodb,
+            "-c",
+            str(odoocfg),
+            "--file",
+            DATADIR + "resolve_ids_many/res.users.csv",
+            "--no-onchange",
+            "--resolve-ids",
+            "--out",
+            str(jsonlog),
+        ],
+    )
+    assert result.exit_code == 0
+    self = mocker.patch("dodoo.CommandWithOdooEnv")
+    self.database = odoodb
+    with OdooEnvironment(self) as env:
+        user = env.ref("__import__.res_users_resolve_1")
+        assert env.ref("base.group_user") in user.groups_id
+        assert env.ref("base.group_partner_manager") in user.groups_id
+
+
+def test_resolve_ids_lazy_unqualified(odoodb, jsonlog, odoocfg):
+    """ Test ids without module in later chunks of lazy input fail cleanly """
+
+    result = CliRunner().invoke(
+        load,
+        [
+            "-d",
+            odoodb,
+            "-c",
+            str(odoocfg),
+            "--file",
+            DATADIR + "resolve_ids_lazy/res.country.state.csv",
+            "--no-onchange",
+            "--resolve-ids",
+            "--lazy",
+            "--batch",
+            "1",
+            "--out",
+            str(jsonlog),
+        ],
+    )
+    assert result.exit_code != 0
+    assert "need a module, when resolved up front: us" in result.output
+
+
+def test_raw(odoodb, jsonlog, odoocfg, mocker, tmpdir):
+    """ Test records are created through create(), in hierarchy order """
+
+    args = [
+        "-d",
+        odoodb,
+        "-c",
+        str(odoocfg),
+        "--file",
+        DATADIR + "raw/res.partner.json",
+        "--no-onchange",
+        "--raw",
+        "--batch",
+        "1",
+        "--out",
+        str(jsonlog),
+    ]
+    result = CliRunner().invoke(load, args)
+    assert result.exit_code == 0
+    self = mocker.patch("dodoo.CommandWithOdooEnv")
+    self.database = odoodb
+    with OdooEnvironment(self) as env:
+        parent = env.ref("__import__.res_partner_raw_1")
+        assert parent.is_company and parent.country_id == env.ref("base.us")
+        child = env.ref("__import__.res_partner_raw_2")
+        assert child.parent_id == parent
+
+    # Existing external ids fail, instead of getting duplicated
+    rawlog = tmpdir.join("raw.json")
+    result = CliRunner().invoke(load, args[:-1] + [str(rawlog)])
+    assert result.exit_code == 0
+    with open(str(rawlog), "r") as logs:
+        records = [json.loads(line) for line in logs.readlines()]
+    assert [record["state"] for record in records] == ["failure", "failure"]
+
+
+def test_raw_many_ids(odoodb, jsonlog, odoocfg, mocker, tmpdir):
+    """ Test x2many database ids read as numbers are created """
+
+    self = mocker.patch("dodoo.CommandWithOdooEnv")
+    self.database = odoodb
+    with OdooEnvironment(self) as env:
+        group = env.ref("base.group_user")
+    tmpdir.join("res.users.csv").write(
+        "id,name,login,groups_id/.id\n"
+        "__import__.res_users_raw_1,Raw User,raw_user,{}\n".format(group.id)
+    )
+    result = CliRunner().invoke(
+        load,
+        [
+            "-d",
+            odoodb,
+            "-c",
+            str(odoocfg),
+            "--file",
+            str(tmpdir.join("res.users.csv")),
+            "--no-onchange",
+            "--raw",
+            "--out",
+            str(jsonlog),
+        ],
+    )
+    assert result.exit_code == 0
+    with OdooEnvironment(self) as env:
+        user = env.ref("__import__.res_users_raw_1")
+        assert env.ref("base.group_user") in user.groups_id
+
+
+def test_typed(odoodb, jsonlog, odoocfg, mocker):
+    """ Test typed columns load, integers don't turn into floats """
+
+    result = CliRunner().invoke(
+        load,
+        [
+            "-d",
+            odoodb,
+            "-c",
+            str(odoocfg),
+            "--file",
+            DATADIR + "typed/res.partner.csv",
+            "--no-onchange",
+            "--typed",
+            "--out",
+            str(jsonlog),
+        ],
+    )
+    assert result.exit_code == 0
+    self = mocker.patch("dodoo.CommandWithOdooEnv")
+    self.database = odoodb
+    with OdooEnvironment(self) as env:
+        partner = env.ref("__import__.res_partner_typed_1")
+        assert partner.color == 3 and partner.type == "contact"
+        partner = env.ref("__import__.res_partner_typed_2")
+        assert partner.type == "invoice" and partner.country_id == env.ref("base.fr")
+
+
+def test_read_workers(odoodb, odoocfg, tmpdir):
+    """ Test concurrent parsing loads as sequential parsing does """
+
+    def run(log, *args):
+        result = CliRunner().invoke(
+            load,
+            [
+                "-d",
+                odoodb,
+                "-c",
+                str(odoocfg),
+                "--file",
+                DATADIR + "res_partner.xlsx",
+                "--file",
+                DATADIR + "workers/res.country.state.json",
+                "--file",
+                DATADIR + "workers/res.country.json",
+                "--no-onchange",
+                "--out",
+                str(log),
+            ]
+            + list(args),
+        )
+        assert result.exit_code == 0
+        with open(str(log), "r") as logs:
+            records = [json.loads(line) for line in logs.readlines()]
+        return [(record["model"], record["candidates"]) for record in records]
+
+    sequential = run(tmpdir.join("sequential.json"))
+    assert sequential == run(tmpdir.join("threads.json"), "--read-workers", "3")
+    assert sequential == run(
+        tmpdir.join("processes.json"), "--read-workers", "3", "--processes"
+    )
+
+    # Parse errors are reported with their file
+    result = CliRunner().invoke(
+        load,
+        [
+            "-d",
+            odoodb,
+            "-c",
+            str(odoocfg),
+            "--file",
+            DATADIR + "read_workers/res.country.csv",
+            "--read-workers",
+            "2",
+            "--out",
+            str(tmpdir.join("bad.json")),
+        ],
+    )
+    assert result.exit_code != 0
+    assert "Cannot parse res.country" in result.output
+
+
+@pytest.mark.parametrize("ext", ["parquet", "arrow", "feather"])
+def test_columnar(odoodb, jsonlog, odoocfg, mocker, tmpdir, ext):
+    """ Test columnar files load in chunks, without unknown columns """
+
+    pa = pytest.importorskip("pyarrow")
+    from pyarrow import feather, parquet
+
+    table = pa.table(
+        {
+            "id": ["__import__.res_country_{}_{}".format(ext, i) for i in range(3)],
+            "name": ["Test Country ({}) {}".format(ext, i) for i in range(3)],
+            "no_such_field": [1, 2, 3],
+        }
+    )
+    path = str(tmpdir.join("res.country." + ext))
+    if ext == "parquet":
+        parquet.write_table(table, path, row_group_size=2)
+    else:
+        feather.write_feather(table, path)
+    result = CliRunner().invoke(
+        load,
+        [
+            "-d",
+            odoodb,
+            "-c",
+            str(odoocfg),
+            "--file",
+            path,
+            "--no-onchange",
+            "--batch",
+            "2",
+            "--lazy",
+            "--out",
+            str(jsonlog),
+        ],
+    )
+    assert result.exit_code == 0
+    self = mocker.patch("dodoo.CommandWithOdooEnv")
+    self.database = odoodb
+    with OdooEnvironment(self) as env:
+        assert env.ref("__import__.res_country_{}_2".format(ext))
+
+
+def test_cache_dir(odoodb, odoocfg, mocker, tmpdir):
+    """ Test parsed input is cached, reruns don't parse it again """
+
+    pytest.importorskip("pyarrow")
+
+    def run(log):
+        return CliRunner().invoke(
+            load,
+            [
+                "-d",
+                odoodb,
+                "-c",
+                str(odoocfg),
+                "--file",
+                DATADIR + "res.partner.csv",
+                "--no-onchange",
+                "--cache-dir",
+                str(tmpdir.join("cache")),
+                "--out",
+                str(log),
+            ],
+        )
+
+    assert run(tmpdir.join("first.json")).exit_code == 0
+    assert tmpdir.join("cache").listdir()
+    parse = mocker.patch("dodoo_loader.cli._parse")
+    assert run(tmpdir.join("second.json")).exit_code == 0
+    assert not parse.called
+    with open(str(tmpdir.join("first.json")), "r") as first, open(
+        str(tmpdir.join("second.json")), "r"
+    ) as second:
+        assert [json.loads(line)["candidates"] for line in first] == [
+            json.loads(line)["candidates"] for line in second
+        ]
+
+
+def test_incremental(odoodb, odoocfg, tmpdir):
+    """ Test reruns only load records that changed since they got logged """
+
+    with open(DATADIR + "res.partner.csv", "r") as f:
+        lines = f.read().splitlines()
+    log = tmpdir.join("log.json")
+
+    def run(content):
+        tmpdir.join("res.partner.csv").write("\n".join(content) + "\n")
+        result = CliRunner().invoke(
+            load,
+            [
+                "-d",
+                odoodb,
+                "-c",
+                str(odoocfg),
+                "--file",
+                str(tmpdir.join("res.partner.csv")),
+                "--no-onchange",
+                "--incremental",
+                "--out",
+                str(log),
+            ],
+        )
+        assert result.exit_code == 0
+        with open(str(log), "r") as f:
+            return [json.loads(line) for line in f]
+
+    first = run(lines)
+    assert all(record["hashes"] for record in first)
+    assert run(lines) == first
+    lines[2] = lines[2].replace("CSV Bill", "CSV William")
+    records = run(lines)[len(first) :]
+    assert [record["candidates"] for record in records] == [
+        ["__import__.res_partner_17"]
+    ]
+
+
+def test_incremental_dtypes(odoodb, odoocfg, tmpdir):
+    """ Test hashes don't change with the dtypes pandas infers per file """
+
+    log = tmpdir.join("log.json")
+
+    def run(content):
+        tmpdir.join("res.partner.csv").write(content)
+        result = CliRunner().invoke(
+            load,
+            [
+                "-d",
+                odoodb,
+                "-c",
+                str(odoocfg),
+                "--file",
+                str(tmpdir.join("res.partner.csv")),
+                "--no-onchange",
+                "--incremental",
+                "--out",
+                str(log),
+            ],
+        )
+        assert result.exit_code == 0
+        with open(str(log), "r") as f:
+            return [json.loads(line) for line in f]
+
+    first = run(
+        "id,name,color\n"
+        "__import__.res_partner_hash_1,Hash One,3\n"
+        "__import__.res_partner_hash_2,Hash Two,4\n"
+    )
+    # The gap turns the color column into floats
+    records = run(
+        "id,name,color\n"
+        "__import__.res_partner_hash_1,Hash One,3\n"
+        "__import__.res_partner_hash_2,Hash Two,\n"
+    )[len(first) :]
+    assert [record["candidates"] for record in records] == [
+        ["__import__.res_partner_hash_2"]
+    ]
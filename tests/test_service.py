@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#
+# This file is part of the dodoo-loader (R) project.
+# Copyright (c) 2018 XOE Corp. SAS
+# Authors: David Arnold, et al.
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library; if not, see <http://www.gnu.org/licenses/>.
+#
+
+import json
+import os
+
+from click.testing import CliRunner
+from dodoo import OdooEnvironment
+
+from dodoo_loader import cli
+from dodoo_loader.service import JOB_OPTIONS, _job_command, serve
+
+HERE = os.path.dirname(__file__)
+DATADIR = os.path.join(HERE, "data/test_service/")
+
+
+def test_serve_spool(odoodb, odoocfg, mocker, tmpdir):
+    """ Test jobs of the spool directory run and report their results """
+    tmpdir.join("job1.json").write(
+        json.dumps(["--file", DATADIR + "res.country.json", "--no-onchange"])
+    )
+    tmpdir.join("job2.json").write(json.dumps(["--no-such-option"]))
+
+    result = CliRunner().invoke(
+        serve, ["-d", odoodb, "-c", str(odoocfg), "--spool", str(tmpdir), "--once"]
+    )
+    assert result.exit_code == 0
+    assert tmpdir.join("job1.json.done").check()
+    with open(str(tmpdir.join("job1.log")), "r") as logs:
+        records = [json.loads(line) for line in logs.readlines()]
+    assert records[0]["state"] == "success"
+    assert tmpdir.join("job2.json.failed").check()
+    assert "no-such-option" in tmpdir.join("job2.err").read()
+
+    self = mocker.patch("dodoo.CommandWithOdooEnv")
+    self.database = odoodb
+    with OdooEnvironment(self) as env:
+        assert env.ref("__import__.res_country_service_2")
+
+
+def test_job_options():
+    """ Test jobs accept all the options load_pipeline takes """
+    code = cli.load_pipeline.__code__
+    # Without env and metadata
+    assert JOB_OPTIONS == list(code.co_varnames[1 : code.co_argcount - 1])
+    assert sorted(param.name for param in _job_command().params) == sorted(JOB_OPTIONS)